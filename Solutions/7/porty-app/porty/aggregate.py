@@ -0,0 +1,170 @@
+# aggregate.py
+
+import argparse
+import math
+from collections import namedtuple
+from operator import attrgetter, itemgetter
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Union
+
+import porty.tableformat as tableformat
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# The aggregates computed for every field
+AGGREGATES = ('sum', 'count', 'mean', 'min', 'max')
+
+def _group_type(key: str, fields: Sequence[str], ops: Sequence[str]) -> type:
+    '''
+    Make the namedtuple type of the result rows: the key followed by field_op columns.
+    '''
+    for op in ops:
+        if op not in AGGREGATES:
+            raise ValueError(f'Unknown aggregate {op}')
+    return namedtuple('Group', [key] + [f'{field}_{op}' for field in fields for op in ops])
+
+def _getter(record: Any, names: Sequence[str]) -> Callable:
+    '''
+    Make a getter returning a tuple of the named values of a dict or an object.
+    '''
+    getter = itemgetter(*names) if isinstance(record, dict) else attrgetter(*names)
+    if len(names) == 1:
+        return lambda record: (getter(record),)
+    return getter
+
+def group_by(records: Union[Iterable[Any], Dict[str, Any]], key: str, fields: Sequence[str],
+             ops: Sequence[str] = AGGREGATES) -> List[tuple]:
+    """
+    Group records by a key and aggregate numeric fields per group.
+
+    Records (dicts such as those returned by parse_csv, or objects such as Stock)
+    are consumed in a single streaming pass into a hash table of running
+    aggregates. Columnar data (a dict of equal-length arrays) is aggregated with
+    NumPy instead when it is installed.
+
+    Args:
+        records: An iterable of records, or a dict mapping column names to arrays.
+        key (str): The name of the field to group by.
+        fields (Sequence[str]): The numeric fields to aggregate.
+        ops (Sequence[str]): The aggregates to compute (any of AGGREGATES).
+
+    Returns:
+        List[tuple]: One Group namedtuple per key, in order of first appearance.
+    """
+    if isinstance(records, dict):
+        return group_by_columns(records, key, fields, ops)
+
+    Group = _group_type(key, fields, ops)
+    groups: Dict[Any, List[List[float]]] = {}
+    getter = None
+    for record in records:
+        if getter is None:
+            getter = _getter(record, [key, *fields])
+        k, *values = getter(record)
+        acc = groups.get(k)
+        if acc is None:
+            # Per field: count, sum, min, max
+            groups[k] = [[1, v, v, v] for v in values]
+            continue
+        for a, v in zip(acc, values):
+            a[0] += 1
+            a[1] += v
+            if v < a[2]:
+                a[2] = v
+            if v > a[3]:
+                a[3] = v
+
+    results = []
+    for k, acc in groups.items():
+        row = [k]
+        for count, total, low, high in acc:
+            stats = {'sum': total, 'count': count, 'mean': total / count, 'min': low, 'max': high}
+            row.extend(stats[op] for op in ops)
+        results.append(Group(*row))
+    return results
+
+def group_by_columns(columns: Dict[str, Any], key: str, fields: Sequence[str],
+                     ops: Sequence[str] = AGGREGATES) -> List[tuple]:
+    """
+    Group columnar data by a key column with NumPy.
+
+    Args:
+        columns (Dict[str, Any]): Column name to array (or list) of values.
+        key (str): The name of the column to group by.
+        fields (Sequence[str]): The numeric columns to aggregate.
+        ops (Sequence[str]): The aggregates to compute (any of AGGREGATES).
+
+    Returns:
+        List[tuple]: One Group namedtuple per key, in order of first appearance.
+    """
+    if np is None:
+        rows = (dict(zip(columns, values)) for values in zip(*columns.values()))
+        return group_by(rows, key, fields, ops)
+
+    Group = _group_type(key, fields, ops)
+    keys, first, inverse = np.unique(np.asarray(columns[key]), return_index=True, return_inverse=True)
+    inverse = inverse.ravel()
+    counts = np.bincount(inverse, minlength=keys.size)
+
+    stats = []
+    for field in fields:
+        values = np.asarray(columns[field])
+        if values.dtype.kind in 'iub':
+            values = values.astype(np.int64)
+            total = np.zeros(keys.size, dtype=np.int64)
+            np.add.at(total, inverse, values)
+            low = np.full(keys.size, np.iinfo(np.int64).max)
+            high = np.full(keys.size, np.iinfo(np.int64).min)
+        else:
+            values = values.astype(float)
+            total = np.bincount(inverse, weights=values, minlength=keys.size)
+            low = np.full(keys.size, math.inf)
+            high = np.full(keys.size, -math.inf)
+        np.minimum.at(low, inverse, values)
+        np.maximum.at(high, inverse, values)
+        stats.append({'sum': total, 'count': counts, 'mean': total / counts, 'min': low, 'max': high})
+
+    # Report the groups in order of first appearance, like the streaming path
+    results = []
+    for g in np.argsort(first, kind='stable'):
+        row = [keys[g].item()]
+        for s in stats:
+            row.extend(s[op][g].item() for op in ops)
+        results.append(Group(*row))
+    return results
+
+def print_groups(groups: List[tuple], formatter: tableformat.TableFormatter) -> None:
+    """
+    Print grouped results as a table, with two decimals for the floating point columns.
+
+    Args:
+        groups (List[tuple]): Group namedtuples as returned by group_by.
+        formatter (TableFormatter): The formatter used to format the table.
+    """
+    if not groups:
+        return
+    formats = ['.2f' if isinstance(v, float) else '!s' for v in groups[0]]
+    tableformat.print_table(groups, list(groups[0]._fields), formatter, formats)
+
+def main():
+
+    # Declare the argparser
+    parser = argparse.ArgumentParser(description="Total the holdings of a portfolio file per symbol.")
+    parser.add_argument("portfolio", type=Path, help="Path to the input portfolio file")
+    parser.add_argument("--fields",  type=str, nargs='+', default=['shares', 'cost'], help="Fields to aggregate")
+    parser.add_argument("--ops",     type=str, nargs='+', default=['sum', 'count'], choices=AGGREGATES, help="Aggregates to compute")
+    parser.add_argument("--fmt",     type=str, default='txt', help="The table format")
+    args = parser.parse_args()
+
+    # Group the portfolio by symbol
+    from porty.portfolio import Portfolio
+    from porty.report import read_portfolio
+    portfolio = Portfolio(stocks=read_portfolio(args.portfolio))
+    print_groups(portfolio.group_by('name', args.fields, args.ops), tableformat.create_formatter(args.fmt))
+
+# If you know you know ;)
+if __name__ == '__main__':
+    main()
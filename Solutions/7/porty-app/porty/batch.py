@@ -0,0 +1,236 @@
+# batch.py
+
+import argparse
+import array
+import io
+import multiprocessing
+import os
+import struct
+import sys
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import porty.report as report
+import porty.tableformat as tableformat
+
+# Layout header: number of prices, length of the encoded names
+_HEADER = struct.Struct('<QQ')
+
+# Serializes the resource_tracker.register patch in attach_shared_memory
+_register_lock = threading.Lock()
+
+def attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    """
+    Attach to a shared memory block created by another process, without tracking it.
+
+    Only the creator of a block registers it with a resource tracker and
+    unlinks it. A process that attaches and registers it too would have its
+    own tracker unlink the block when it exits, or, sharing the creator's
+    tracker, would clash with the creator's registration.
+
+    Before Python 3.13 this swaps out resource_tracker.register for the
+    duration of the attach. Concurrent calls are serialized by a lock, but
+    another thread creating a block meanwhile would go untracked, so do not
+    create blocks in one thread while attaching in another.
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    with _register_lock:
+        register = resource_tracker.register
+        resource_tracker.register = lambda name, rtype: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+class SharedPrices:
+    """
+    A price table stored in a shared memory block.
+
+    The block holds the names, encoded and separated by NUL bytes, followed by
+    the prices as an array of doubles. Worker processes attach to the block by
+    name instead of receiving a pickled copy of the table.
+    """
+    def __init__(self, shm: shared_memory.SharedMemory):
+        self.shm = shm
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @classmethod
+    def create(cls, prices: Dict[str, float]) -> "SharedPrices":
+        """
+        Copy a price table into a new shared memory block.
+
+        Args:
+            prices (Dict[str, float]): Mapping of stock names to prices.
+
+        Returns:
+            SharedPrices: The shared table. The creator must call unlink() when done.
+        """
+        names = '\0'.join(prices).encode()
+        offset = _HEADER.size + (len(names) + 7) // 8 * 8
+        shm = shared_memory.SharedMemory(create=True, size=offset + 8 * len(prices))
+        _HEADER.pack_into(shm.buf, 0, len(prices), len(names))
+        shm.buf[_HEADER.size:_HEADER.size + len(names)] = names
+        shm.buf[offset:offset + 8 * len(prices)] = array.array('d', prices.values()).tobytes()
+        return cls(shm)
+
+    @classmethod
+    def attach(cls, name: str) -> "SharedPrices":
+        """
+        Attach to a shared table created by another process.
+        """
+        return cls(attach_shared_memory(name))
+
+    def to_dict(self) -> Dict[str, float]:
+        """
+        Build a dictionary lookup from the shared table.
+        """
+        count, size = _HEADER.unpack_from(self.shm.buf, 0)
+        if count == 0:
+            return {}
+        names = bytes(self.shm.buf[_HEADER.size:_HEADER.size + size]).decode().split('\0')
+        offset = _HEADER.size + (size + 7) // 8 * 8
+        values = self.shm.buf[offset:offset + 8 * count].cast('d')
+        try:
+            return dict(zip(names, values.tolist()))
+        finally:
+            values.release()
+
+    def close(self) -> None:
+        self.shm.close()
+
+    def unlink(self) -> None:
+        self.shm.unlink()
+
+# The price table of a worker process, set up once by _init_worker
+_prices: Dict[str, float] = {}
+
+def _init_worker(shm_name: str) -> None:
+    global _prices
+    shared = SharedPrices.attach(shm_name)
+    _prices = shared.to_dict()
+    shared.close()
+
+def _report_one(task: Tuple[Path, str, Optional[Path]]) -> Tuple[Path, int, Optional[str], Optional[str]]:
+    '''
+    Produce the report of a single portfolio in a worker process.
+
+    Returns the portfolio file, the number of rows, the report text (None when it
+    was written to its own output file) and an error message (None on success).
+    '''
+    portfolio_file, fmt, output = task
+    try:
+        rows = report.make_report(report.read_portfolio(portfolio_file), _prices)
+        if output is not None:
+            with output.open('w') as out:
+                report.print_report(rows, tableformat.create_formatter(fmt, out))
+            return portfolio_file, len(rows), None, None
+        out = io.StringIO()
+        report.print_report(rows, tableformat.create_formatter(fmt, out))
+        return portfolio_file, len(rows), out.getvalue(), None
+    except Exception as e:
+        return portfolio_file, 0, None, f'{type(e).__name__}: {e}'
+
+def _output_paths(portfolio_files: List[Path], outdir: Path, fmt: str) -> List[Path]:
+    '''
+    Name the report file of each portfolio after its path relative to the directory
+    common to all the portfolios, so inputs with the same name do not overwrite each other.
+    '''
+    resolved = [f.resolve() for f in portfolio_files]
+    common = Path(os.path.commonpath([f.parent for f in resolved])) if resolved else None
+    outputs = [outdir / f.relative_to(common).with_suffix(f'.{fmt}') for f in resolved]
+    seen: Dict[Path, Path] = {}
+    for f, output in zip(portfolio_files, outputs):
+        if output in seen:
+            raise ValueError(f'{seen[output]} and {f} would both be reported to {output}')
+        seen[output] = f
+    for parent in {output.parent for output in outputs}:
+        parent.mkdir(parents=True, exist_ok=True)
+    return outputs
+
+def batch_report(portfolio_files: List[Path], price_file: Path, fmt: str = 'txt',
+                 outdir: Optional[Path] = None, workers: int = None) -> Iterator[Tuple[Path, int, Optional[str], Optional[str]]]:
+    """
+    Produce reports for many portfolios against a single price file.
+
+    The prices are read once and shared with the worker processes. With an
+    output directory each report is written to its own file and results arrive
+    as they finish; otherwise report texts are returned in input order.
+
+    Args:
+        portfolio_files (List[Path]): The portfolio files to report on.
+        price_file (Path): Path to the CSV file containing current stock prices.
+        fmt (str): The table format.
+        outdir (Path, optional): Directory for per-portfolio report files, laid out like the portfolio files.
+        workers (int, optional): Number of worker processes. Defaults to the CPU count.
+
+    Returns:
+        Iterator: (portfolio file, row count, report text or None, error or None) per portfolio.
+
+    Raises:
+        ValueError: If two portfolios would be reported to the same file.
+    """
+    outputs = _output_paths(portfolio_files, outdir, fmt) if outdir else [None] * len(portfolio_files)
+    shared = SharedPrices.create(report.read_prices(price_file))
+    try:
+        tasks = [(f, fmt, output) for f, output in zip(portfolio_files, outputs)]
+        with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(shared.name,)) as pool:
+            results = pool.imap_unordered(_report_one, tasks) if outdir else pool.imap(_report_one, tasks)
+            yield from results
+    finally:
+        shared.close()
+        shared.unlink()
+
+def main():
+
+    # Declare the argparser
+    parser = argparse.ArgumentParser(description="Create reports for many portfolio files against one prices file.")
+    parser.add_argument("prices",     type=Path, help="Path to the input prices file")
+    parser.add_argument("portfolios", type=Path, nargs='+', help="Paths to the input portfolio files")
+    parser.add_argument("--fmt",      type=str, default='txt', help="The table format")
+    parser.add_argument("--outdir",   type=Path, help="Write one report per portfolio into this directory")
+    parser.add_argument("--output",   type=Path, help="Write all the reports into this file (default: stdout)")
+    parser.add_argument("--workers",  type=int, help="Number of worker processes")
+    args = parser.parse_args()
+
+    if args.outdir:
+        args.outdir.mkdir(parents=True, exist_ok=True)
+    out = args.output.open('w') if args.output else sys.stdout
+
+    # Run the batch, reporting progress as we go
+    start = time.perf_counter()
+    files = rows = failures = 0
+    try:
+        for portfolio_file, nrows, text, error in batch_report(args.portfolios, args.prices, args.fmt, args.outdir, args.workers):
+            files += 1
+            rows += nrows
+            if error:
+                failures += 1
+                print(f'{portfolio_file}: {error}', file=sys.stderr)
+            elif text is not None:
+                out.write(f'{portfolio_file}\n{text}\n')
+            if files % 100 == 0:
+                elapsed = time.perf_counter() - start
+                print(f'{files}/{len(args.portfolios)} portfolios, {rows / elapsed:0.0f} rows/s', file=sys.stderr)
+    except ValueError as e:
+        parser.error(str(e))
+    finally:
+        if args.output:
+            out.close()
+
+    # Print the summary
+    elapsed = time.perf_counter() - start
+    print(f'{files} portfolios ({failures} failed), {rows} rows in {elapsed:0.2f}s '
+          f'({files / elapsed:0.1f} portfolios/s, {rows / elapsed:0.0f} rows/s)', file=sys.stderr)
+    if failures:
+        sys.exit(1)
+
+# If you know you know ;)
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,714 @@
+# bench.py
+
+import argparse
+import collections
+import contextlib
+import fnmatch
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from collections import namedtuple
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import yaml
+
+import porty.aggregate as aggregate
+import porty.datagen as datagen
+import porty.fileparse as fileparse
+import porty.history as history
+import porty.journal as journal
+import porty.pcost as pcost
+import porty.report as report
+import porty.ringbuffer as ringbuffer
+import porty.tableformat as tableformat
+import porty.ticklog as ticklog
+from porty.portfolio import Portfolio
+from porty.store import PortfolioStore
+from porty.stock import Stock
+
+# The default number of rows every benchmark runs at
+SIZES = [1_000, 100_000, 10_000_000]
+
+# A single measurement of a benchmark at a given size
+BenchResult = namedtuple('BenchResult', ['name', 'rows', 'best', 'mean', 'repeat'])
+
+# Registry of benchmark name -> (setup function, maximum rows)
+BENCHMARKS: Dict[str, tuple] = {}
+
+def benchmark(name: str, max_rows: Optional[int] = None) -> Callable:
+    """
+    Decorator that registers a benchmark setup function.
+
+    The decorated function receives a Dataset and a row count and returns a
+    zero-argument callable. Only the callable is timed, so all the file
+    generation and loading that is not being measured belongs in the setup.
+
+    Args:
+        name (str): The unique name of the benchmark.
+        max_rows (int, optional): The largest size the benchmark supports. Larger sizes are skipped.
+
+    Returns:
+        Callable: A decorator registering the setup function.
+    """
+    def decorator(setup: Callable) -> Callable:
+        if name in BENCHMARKS:
+            raise ValueError(f'Duplicate benchmark {name}')
+        BENCHMARKS[name] = (setup, max_rows)
+        return setup
+    return decorator
+
+class Dataset:
+    """
+    Lazily generates and caches the synthetic data files used by the benchmarks.
+    """
+    def __init__(self, directory: Path, seed: int = 0):
+        self.directory = directory
+        self.seed = seed
+        self.files: Dict[tuple, Path] = {}
+
+    def path(self, kind: str, nrows: int, dirty: float = 0.0) -> Path:
+        """
+        Get the path of a data file, generating it on first use.
+
+        Args:
+            kind (str): One of the porty.datagen kinds.
+            nrows (int): The number of rows in the file.
+            dirty (float): The fraction of rows with a missing value.
+
+        Returns:
+            Path: The path of the generated file.
+        """
+        key = (kind, nrows, dirty)
+        if key not in self.files:
+            suffix = f'-dirty{dirty}' if dirty else ''
+            path = self.directory / f'{kind}-{nrows}{suffix}.{"yaml" if kind == "yaml" else "csv"}'
+            nsymbols = nrows if kind == 'prices' else 5000
+            datagen.generate(kind, path, nrows, nsymbols=nsymbols, seed=self.seed, dirty=dirty)
+            self.files[key] = path
+        return self.files[key]
+
+def _read_lines(path: Path) -> List[str]:
+    '''
+    Read a file into memory so that the benchmarks measure parsing, not disk I/O.
+    '''
+    with path.open() as f:
+        return f.readlines()
+
+@benchmark('parse_csv.dict')
+def bench_parse_csv_dict(data: Dataset, nrows: int) -> Callable:
+    lines = _read_lines(data.path('portfolio', nrows))
+    return lambda: fileparse.parse_csv(lines)
+
+@benchmark('parse_csv.dict.select_types')
+def bench_parse_csv_dict_select(data: Dataset, nrows: int) -> Callable:
+    lines = _read_lines(data.path('portfolio', nrows))
+    return lambda: fileparse.parse_csv(lines, select=['name', 'price'], types=[str, float])
+
+@benchmark('parse_csv.tuple')
+def bench_parse_csv_tuple(data: Dataset, nrows: int) -> Callable:
+    lines = _read_lines(data.path('prices', nrows))
+    return lambda: fileparse.parse_csv(lines, has_headers=False)
+
+@benchmark('parse_csv.tuple.types')
+def bench_parse_csv_tuple_types(data: Dataset, nrows: int) -> Callable:
+    lines = _read_lines(data.path('prices', nrows))
+    return lambda: fileparse.parse_csv(lines, types=[str, float], has_headers=False)
+
+@benchmark('parse_csv.dict.types')
+def bench_parse_csv_dict_types(data: Dataset, nrows: int) -> Callable:
+    lines = _read_lines(data.path('portfolio', nrows))
+    return lambda: fileparse.parse_csv(lines, types=[str, int, float])
+
+@benchmark('parse_csv.dirty.print')
+def bench_parse_csv_dirty_print(data: Dataset, nrows: int) -> Callable:
+    # One row in ten is bad, reported with the two prints per row
+    lines = _read_lines(data.path('portfolio', nrows, dirty=0.1))
+    def run():
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            return fileparse.parse_csv(lines, types=[str, int, float])
+    return run
+
+@benchmark('parse_csv.dirty.errorlog')
+def bench_parse_csv_dirty_errorlog(data: Dataset, nrows: int) -> Callable:
+    lines = _read_lines(data.path('portfolio', nrows, dirty=0.1))
+    return lambda: fileparse.parse_csv(lines, types=[str, int, float], errors=fileparse.ErrorLog())
+
+@benchmark('parse_csv.dates')
+def bench_parse_csv_dates(data: Dataset, nrows: int) -> Callable:
+    lines = _read_lines(data.path('portfoliodate', nrows))
+    types = [str, fileparse.parse_date, fileparse.parse_time, int, float]
+    return lambda: fileparse.parse_csv(lines, types=types)
+
+@benchmark('parse_csv.dates.uncached')
+def bench_parse_csv_dates_uncached(data: Dataset, nrows: int) -> Callable:
+    lines = _read_lines(data.path('portfoliodate', nrows))
+    types = [str, fileparse.parse_date.__wrapped__, fileparse.parse_time.__wrapped__, int, float]
+    return lambda: fileparse.parse_csv(lines, types=types)
+
+@benchmark('read_portfolio')
+def bench_read_portfolio(data: Dataset, nrows: int) -> Callable:
+    path = data.path('portfolio', nrows)
+    return lambda: report.read_portfolio(path)
+
+@benchmark('read_prices')
+def bench_read_prices(data: Dataset, nrows: int) -> Callable:
+    path = data.path('prices', nrows)
+    return lambda: report.read_prices(path)
+
+@benchmark('read_portfolio.where')
+def bench_read_portfolio_where(data: Dataset, nrows: int) -> Callable:
+    # Holdings of 10 of the 5000 symbols
+    path = data.path('portfolio', nrows)
+    names = {datagen.symbol(n) for n in range(10)}
+    return lambda: report.read_portfolio(path, {'name': names})
+
+@benchmark('read_prices.where')
+def bench_read_prices_where(data: Dataset, nrows: int) -> Callable:
+    # The prices of the 5000 symbols a portfolio can hold
+    path = data.path('prices', nrows)
+    names = {datagen.symbol(n) for n in range(5000)}
+    return lambda: report.read_prices(path, {0: names})
+
+@benchmark('pcost')
+def bench_pcost(data: Dataset, nrows: int) -> Callable:
+    path = data.path('portfolio', nrows)
+    return lambda: pcost.portfolio_cost(path, workers=1)
+
+@benchmark('pcost.parallel')
+def bench_pcost_parallel(data: Dataset, nrows: int) -> Callable:
+    path = data.path('portfolio', nrows)
+    return lambda: pcost.portfolio_cost_parallel(path)
+
+@benchmark('pcost.records')
+def bench_pcost_records(data: Dataset, nrows: int) -> Callable:
+    path = data.path('portfolio', nrows)
+    return lambda: pcost.portfolio_cost_records(path)
+
+@benchmark('make_report')
+def bench_make_report(data: Dataset, nrows: int) -> Callable:
+    portfolio = report.read_portfolio(data.path('portfolio', nrows))
+    prices = report.read_prices(data.path('prices', 5000))
+    return lambda: report.make_report(portfolio, prices)
+
+def _store(data: Dataset, nrows: int) -> PortfolioStore:
+    store = PortfolioStore(data.directory / f'store-{nrows}.db')
+    store.load_prices(data.path('prices', 5000), replace=True)
+    return store
+
+@benchmark('store.load')
+def bench_store_load(data: Dataset, nrows: int) -> Callable:
+    store = _store(data, nrows)
+    path = data.path('portfolio', nrows)
+    return lambda: store.load_portfolio(path)
+
+@benchmark('store.report')
+def bench_store_report(data: Dataset, nrows: int) -> Callable:
+    # The same report as make_report, joined in SQL from the stored tables
+    store = _store(data, nrows)
+    store.load_portfolio(data.path('portfolio', nrows))
+    return lambda: list(store.report())
+
+@benchmark('report.top20')
+def bench_report_top(data: Dataset, nrows: int) -> Callable:
+    rows = _report_rows(data, nrows)
+    return lambda: report.top_rows(rows, 20, 'change')
+
+@benchmark('report.top20.sorted')
+def bench_report_top_sorted(data: Dataset, nrows: int) -> Callable:
+    # Full sort, for reference
+    rows = _report_rows(data, nrows)
+    return lambda: sorted(rows, key=report.SORT_KEYS['change'], reverse=True)[:20]
+
+@benchmark('report.sort_rows')
+def bench_report_sort(data: Dataset, nrows: int) -> Callable:
+    rows = _report_rows(data, nrows)
+    return lambda: report.sort_rows(rows, ['name', '-change'])
+
+def _report_rows(data: Dataset, nrows: int) -> List[report.TableRow]:
+    portfolio = report.read_portfolio(data.path('portfolio', nrows))
+    prices = report.read_prices(data.path('prices', 5000))
+    return report.make_report(portfolio, prices)
+
+def _bench_formatter(fmt: str, workers: int = 1) -> Callable:
+    '''
+    Make a benchmark setup that prints a report with the given formatter to /dev/null.
+    '''
+    def setup(data: Dataset, nrows: int) -> Callable:
+        rows = _report_rows(data, nrows)
+        def run():
+            with open(os.devnull, 'w') as out:
+                report.print_report(rows, tableformat.create_formatter(fmt, out, workers))
+        return run
+    return setup
+
+def _bench_formatter_legacy(fmt: str) -> Callable:
+    '''
+    Make a benchmark setup that formats every cell to a string and then emits
+    the row with row(), the way reports were printed before row templates.
+    '''
+    def setup(data: Dataset, nrows: int) -> Callable:
+        rows = _report_rows(data, nrows)
+        def run():
+            with open(os.devnull, 'w') as out:
+                formatter = tableformat.create_formatter(fmt, out)
+                formatter.headings(['Name', 'Shares', 'Price', 'Change'])
+                for name, shares, price, change in rows:
+                    formatter.row([name, str(shares), f'{price:0.2f}', f'{change:0.2f}'])
+        return run
+    return setup
+
+for _fmt in ('txt', 'csv', 'html'):
+    benchmark(f'tableformat.{_fmt}')(_bench_formatter(_fmt))
+    benchmark(f'tableformat.{_fmt}.legacy')(_bench_formatter_legacy(_fmt))
+    for _workers in (2, 4, 8):
+        benchmark(f'tableformat.{_fmt}.parallel{_workers}')(_bench_formatter(_fmt, _workers))
+
+@benchmark('portfolio.total_cost')
+def bench_total_cost(data: Dataset, nrows: int) -> Callable:
+    portfolio = Portfolio(stocks=report.read_portfolio(data.path('portfolio', nrows)))
+    return lambda: portfolio.total_cost
+
+@benchmark('portfolio.total_cost.recomputed')
+def bench_total_cost_recomputed(data: Dataset, nrows: int) -> Callable:
+    portfolio = Portfolio(stocks=report.read_portfolio(data.path('portfolio', nrows)))
+    return lambda: sum(s.cost for s in portfolio.stocks)
+
+@benchmark('portfolio.sell_and_total')
+def bench_sell_and_total(data: Dataset, nrows: int) -> Callable:
+    portfolio = Portfolio(stocks=report.read_portfolio(data.path('portfolio', nrows)))
+    stocks = portfolio.stocks[:100]
+    def run():
+        for s in stocks:
+            s.sell(1)
+            portfolio.total_cost
+        for s in stocks:
+            s.shares += 1
+    return run
+
+def _symbols(portfolio: Portfolio, n: int = 100) -> List[str]:
+    return [s.name for s in portfolio.stocks[:n]]
+
+@benchmark('portfolio.lookup')
+def bench_portfolio_lookup(data: Dataset, nrows: int) -> Callable:
+    # 100 symbol lookups through the hash index
+    portfolio = Portfolio(stocks=report.read_portfolio(data.path('portfolio', nrows)))
+    names = _symbols(portfolio)
+    return lambda: [portfolio[name] for name in names]
+
+@benchmark('portfolio.lookup.scan')
+def bench_portfolio_lookup_scan(data: Dataset, nrows: int) -> Callable:
+    # The same lookups as linear scans, for reference
+    portfolio = Portfolio(stocks=report.read_portfolio(data.path('portfolio', nrows)))
+    names = _symbols(portfolio)
+    return lambda: [[s for s in portfolio.stocks if s.name == name] for name in names]
+
+@benchmark('portfolio.where')
+def bench_portfolio_where(data: Dataset, nrows: int) -> Callable:
+    # 100 narrow price range queries, the first one building the sorted index
+    portfolio = Portfolio(stocks=report.read_portfolio(data.path('portfolio', nrows)))
+    return lambda: [portfolio.where(price_between=(p, p + 0.5)) for p in range(100)]
+
+@benchmark('portfolio.trade_and_where')
+def bench_portfolio_trade_and_where(data: Dataset, nrows: int) -> Callable:
+    # 100 price changes, each followed by a range query on the updated index
+    portfolio = Portfolio(stocks=report.read_portfolio(data.path('portfolio', nrows)))
+    portfolio.where(price_between=(0, 1))
+    stocks = portfolio.stocks[:100]
+    def run():
+        for p, s in enumerate(stocks):
+            s.price += 1.0
+            portfolio.where(price_between=(p, p + 0.5))
+        for s in stocks:
+            s.price -= 1.0
+    return run
+
+@benchmark('aggregate.group_by')
+def bench_group_by(data: Dataset, nrows: int) -> Callable:
+    records = fileparse.parse_csv(_read_lines(data.path('portfolio', nrows)), types=[str, int, float])
+    return lambda: aggregate.group_by(records, 'name', ['shares', 'price'])
+
+@benchmark('aggregate.group_by.columns')
+def bench_group_by_columns(data: Dataset, nrows: int) -> Callable:
+    import numpy as np
+    records = fileparse.parse_csv(_read_lines(data.path('portfolio', nrows)), types=[str, int, float])
+    columns = { name: np.array([r[name] for r in records]) for name in ('name', 'shares', 'price') }
+    return lambda: aggregate.group_by(columns, 'name', ['shares', 'price'])
+
+@benchmark('parse_yaml', max_rows=100_000)
+def bench_parse_yaml(data: Dataset, nrows: int) -> Callable:
+    text = data.path('yaml', nrows).read_text()
+    def run():
+        doc = fileparse.parse_yaml(io.StringIO(text))
+        return Portfolio(stocks=[Stock(**s) for s in doc['stocks']])
+    return run
+
+@benchmark('parse_yaml.pure', max_rows=100_000)
+def bench_parse_yaml_pure(data: Dataset, nrows: int) -> Callable:
+    # The pure-Python loader with one model validation per stock, for reference
+    text = data.path('yaml', nrows).read_text()
+    def run():
+        doc = yaml.safe_load(text)
+        return Portfolio(stocks=[Stock(**s) for s in doc['stocks']])
+    return run
+
+@benchmark('portfolio.from_yaml', max_rows=1_000_000)
+def bench_portfolio_from_yaml(data: Dataset, nrows: int) -> Callable:
+    text = data.path('yaml', nrows).read_text()
+    return lambda: Portfolio.from_yaml(io.StringIO(text))
+
+def _history(data: Dataset, nrows: int) -> history.PriceHistory:
+    return history.read_history(data.path('ticks', nrows), fileparse.ErrorLog())
+
+@benchmark('history.price_as_of', max_rows=1_000_000)
+def bench_history_price_as_of(data: Dataset, nrows: int) -> Callable:
+    # 10000 lookups of random symbols at random times
+    prices = _history(data, nrows)
+    rng = random.Random(0)
+    start, end = min(t[0] for t in prices.times.values()), prices.last_time()
+    queries = [(rng.choice(prices.symbols), rng.randint(start, end)) for _ in range(10000)]
+    return lambda: [prices.price_as_of(symbol, t) for symbol, t in queries]
+
+@benchmark('history.prices_as_of', max_rows=1_000_000)
+def bench_history_prices_as_of(data: Dataset, nrows: int) -> Callable:
+    # The price table of every symbol as of the middle of the history
+    prices = _history(data, nrows)
+    middle = (min(t[0] for t in prices.times.values()) + prices.last_time()) // 2
+    return lambda: prices.prices_as_of(middle)
+
+@benchmark('history.join_as_of', max_rows=1_000_000)
+def bench_history_join_as_of(data: Dataset, nrows: int) -> Callable:
+    prices = _history(data, nrows)
+    rows = history.read_dated_portfolio(data.path('portfoliodate', nrows))
+    return lambda: prices.join_as_of(rows)
+
+@benchmark('ticklog.merge')
+def bench_ticklog_merge(data: Dataset, nrows: int) -> Callable:
+    # Four logs of a quarter of the rows each, one of them gzip compressed
+    paths = []
+    for i in range(4):
+        path = data.directory / f'ticklog-{nrows}-{i}.csv{".gz" if i == 0 else ""}'
+        if not path.exists():
+            datagen.generate('ticks', path, nrows // 4, nsymbols=30 + i, seed=i)
+        paths.append(path)
+    return lambda: collections.deque(ticklog.merge_logs(paths), maxlen=0)
+
+def _trades(nrows: int, nsymbols: int = 5000) -> List[tuple]:
+    '''
+    A reproducible stream of buys and of sells of shares that are held.
+    '''
+    rng = random.Random(nrows)
+    held: Dict[str, int] = {}
+    trades = []
+    for _ in range(nrows):
+        name = datagen.symbol(rng.randrange(nsymbols))
+        if held.get(name, 0) > 1 and rng.random() < 0.4:
+            shares = rng.randrange(1, held[name])
+            held[name] -= shares
+            trades.append((b'S', name, shares, 0.0))
+        else:
+            shares = rng.randrange(1, 1000)
+            held[name] = held.get(name, 0) + shares
+            trades.append((b'B', name, shares, round(rng.uniform(1, 500), 2)))
+    return trades
+
+def _journal_trades(j: journal.Journal, trades: List[tuple]) -> None:
+    for op, name, shares, price in trades:
+        if op == b'B':
+            j.buy(name, shares, price)
+        else:
+            j.sell(name, shares)
+
+@benchmark('journal.append', max_rows=1_000_000)
+def bench_journal_append(data: Dataset, nrows: int) -> Callable:
+    trades = _trades(nrows)
+    def run():
+        with tempfile.TemporaryDirectory(dir=data.directory) as directory:
+            with journal.Journal(Path(directory), snapshot_every=100_000) as j:
+                _journal_trades(j, trades)
+    return run
+
+@benchmark('journal.recover', max_rows=1_000_000)
+def bench_journal_recover(data: Dataset, nrows: int) -> Callable:
+    # Recovery loads the last snapshot and replays at most 100k trades, whatever the history
+    directory = data.directory / f'journal-{nrows}'
+    if not directory.exists():
+        with journal.Journal(directory, snapshot_every=100_000) as j:
+            _journal_trades(j, _trades(nrows))
+    return lambda: journal.recover(directory)
+
+# The tick sent by the transport benchmarks, as a CSV line and as ring fields
+_TICK_LINE = '"AA",39.48,"6/11/2007","09:36.30",-0.18,39.67,39.69,39.45,181800\n'
+_TICK_FIELDS = ('AA', 39.48, 13675, 576.5, -0.18, 39.67, 39.69, 39.45, 181800)
+
+def _parse_tick(line: str) -> tuple:
+    name, price, date, tm, change, open_, high, low, volume = line.split(',')
+    return (name.strip('"'), float(price), ticklog.tick_time(date.strip('"'), tm.strip('"')),
+            float(change), float(open_), float(high), float(low), int(volume))
+
+def _tail(f: Any) -> Any:
+    '''
+    Follow a file being written by another process, line by line.
+    '''
+    idle, partial = 0, ''
+    while True:
+        line = f.readline()
+        if line.endswith('\n'):
+            idle = 0
+            yield partial + line
+            partial = ''
+        else:
+            partial += line
+            idle += 1
+            ringbuffer.backoff(idle)
+
+def _ring_consumer(name: str, nrows: int, position: Any, echo: Optional[str]) -> None:
+    '''
+    Read ticks from a ring, telling the producer how far it got or echoing each tick to another ring.
+    '''
+    rings = [ringbuffer.TickRing.attach(name)] + ([ringbuffer.TickRing.attach(echo)] if echo else [])
+    reader = ringbuffer.TickReader(rings[0], oldest=True)
+    writer = ringbuffer.TickWriter(rings[1]) if echo else None
+    idle = 0
+    while reader.next <= nrows:
+        ticks = reader.poll()
+        if not ticks:
+            idle += 1
+            ringbuffer.backoff(idle)
+            continue
+        idle = 0
+        if writer:
+            for tick in ticks:
+                writer.publish(*tick[1:-1])
+        position.value = reader.next
+    for ring in rings:
+        ring.close()
+
+def _line_consumer(source: Any, nrows: int, echo: Any) -> None:
+    '''
+    Read and parse CSV ticks from a pipe (a file descriptor) or a file being written, optionally echoing each line.
+    '''
+    with open(source, newline='') as f, (open(echo, 'w') if echo is not None else contextlib.nullcontext()) as out:
+        lines = _tail(f) if isinstance(source, (str, Path)) else f
+        for _, line in zip(range(nrows), lines):
+            _parse_tick(line)
+            if out:
+                out.write(line)
+                out.flush()
+
+def _transport(kind: str, directory: Path, nrows: int, roundtrip: bool) -> None:
+    '''
+    Send ticks to a consumer process, one at a time as a live feed would.
+
+    The ring producer is held back when it gets near to overwriting ticks the
+    consumer has not read, so every transport delivers every tick. With
+    `roundtrip`, the consumer echoes each tick back before the next one is sent.
+    '''
+    if kind == 'ring':
+        rings = [ringbuffer.TickRing.create() for _ in range(2 if roundtrip else 1)]
+        position = multiprocessing.Value('q', 1, lock=False)
+        consumer = multiprocessing.Process(target=_ring_consumer,
+                                           args=(rings[0].name, nrows, position, rings[1].name if roundtrip else None))
+        consumer.start()
+        writer = ringbuffer.TickWriter(rings[0])
+        echoes = iter(ringbuffer.TickReader(rings[1])) if roundtrip else None
+        limit = rings[0].capacity - 1024
+        for seq in range(1, nrows + 1):
+            writer.publish(*_TICK_FIELDS)
+            if echoes:
+                next(echoes)
+            elif seq % 1024 == 0:
+                idle = 0
+                while seq - position.value > limit:
+                    idle += 1
+                    ringbuffer.backoff(idle)
+        consumer.join()
+        for ring in rings:
+            ring.close()
+            ring.unlink()
+        return
+
+    # The pipe and file consumers read CSV lines and parse them again
+    if kind == 'pipe':
+        paths = [os.pipe() for _ in range(2 if roundtrip else 1)]
+        source, sink = paths[0][0], paths[0][1]
+        echo, back = (paths[1][1], paths[1][0]) if roundtrip else (None, None)
+    else:
+        paths = [directory / f'transport-{os.getpid()}-{i}.csv' for i in range(2 if roundtrip else 1)]
+        for path in paths:
+            path.touch()
+        source = sink = str(paths[0])
+        echo = back = str(paths[1]) if roundtrip else None
+    consumer = multiprocessing.Process(target=_line_consumer, args=(source, nrows, echo))
+    consumer.start()
+    if kind == 'pipe':
+        os.close(source)
+        if roundtrip:
+            os.close(echo)
+    with open(sink, 'w') as out, (open(back, newline='') if roundtrip else contextlib.nullcontext()) as f:
+        echoes = None if not roundtrip else _tail(f) if kind == 'file' else iter(f)
+        for _ in range(nrows):
+            out.write(_TICK_LINE)
+            out.flush()
+            if echoes:
+                _parse_tick(next(echoes))
+    consumer.join()
+    if kind == 'file':
+        for path in paths:
+            path.unlink()
+
+for _kind in ('ring', 'pipe', 'file'):
+    benchmark(f'transport.{_kind}', max_rows=1_000_000)(
+        lambda data, nrows, kind=_kind: lambda: _transport(kind, data.directory, nrows, False))
+    benchmark(f'transport.{_kind}.roundtrip', max_rows=100_000)(
+        lambda data, nrows, kind=_kind: lambda: _transport(kind, data.directory, nrows, True))
+
+@benchmark('mortgage.simulate', max_rows=1_000_000)
+def bench_mortgage_simulate(data: Dataset, nrows: int) -> Callable:
+    import numpy as np
+    import porty.mortgage as mortgage
+    rng = np.random.default_rng(data.seed)
+    principal = rng.uniform(100_000, 1_000_000, nrows)
+    rate = rng.uniform(0.01, 0.09, nrows)
+    payment = principal * rng.uniform(0.006, 0.012, nrows)
+    windows = [mortgage.Window(1000.0, 61, 108)]
+    return lambda: mortgage.simulate(principal, rate, payment, windows)
+
+@benchmark('mortgage.payoff', max_rows=100_000)
+def bench_mortgage_payoff(data: Dataset, nrows: int) -> Callable:
+    import porty.mortgage as mortgage
+    windows = [mortgage.Window(1000.0, 61, 108)]
+    return lambda: [mortgage.Amortization(500000.0, 0.05, 2684.11 + n % 100, windows).payoff() for n in range(nrows)]
+
+def run_benchmark(name: str, data: Dataset, nrows: int, repeat: int = 3) -> BenchResult:
+    """
+    Time a single registered benchmark.
+
+    Args:
+        name (str): The name of the benchmark.
+        data (Dataset): The data files to run against.
+        nrows (int): The number of rows to run with.
+        repeat (int): How many times to run the timed callable.
+
+    Returns:
+        BenchResult: The best and mean wall time of the runs.
+    """
+    setup, _ = BENCHMARKS[name]
+    func = setup(data, nrows)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return BenchResult(name, nrows, min(timings), sum(timings) / len(timings), repeat)
+
+def run_all(names: List[str], sizes: List[int], repeat: int = 3, seed: int = 0) -> List[BenchResult]:
+    """
+    Run the given benchmarks at every size they support.
+
+    Args:
+        names (List[str]): The benchmarks to run.
+        sizes (List[int]): The row counts to run at.
+        repeat (int): How many times to run each benchmark.
+        seed (int): Seed for the synthetic data.
+
+    Returns:
+        List[BenchResult]: One result per benchmark and size.
+    """
+    results = []
+    with tempfile.TemporaryDirectory(prefix='porty-bench-') as tmpdir:
+        data = Dataset(Path(tmpdir), seed)
+        for nrows in sizes:
+            for name in names:
+                _, max_rows = BENCHMARKS[name]
+                if max_rows is not None and nrows > max_rows:
+                    continue
+                result = run_benchmark(name, data, nrows, repeat)
+                print(f'{result.name:<32s} {result.rows:>10d} {result.best:>10.4f}s', file=sys.stderr)
+                results.append(result)
+    return results
+
+def to_json(results: List[BenchResult]) -> Dict[str, Any]:
+    """
+    Convert benchmark results into a JSON-serializable document.
+    """
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': { f'{r.name}@{r.rows}': r._asdict() for r in results },
+    }
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """
+    Compare benchmark results against a stored baseline.
+
+    Args:
+        current (Dict[str, Any]): The results of this run, as produced by to_json.
+        baseline (Dict[str, Any]): The stored baseline results.
+        threshold (float): The allowed relative slowdown (0.1 allows runs to be 10% slower).
+
+    Returns:
+        List[str]: A description of every benchmark that regressed.
+    """
+    regressions = []
+    for key, result in current['results'].items():
+        base = baseline['results'].get(key)
+        if base is None:
+            continue
+        ratio = result['best'] / base['best']
+        if ratio > 1 + threshold:
+            regressions.append(f'{key}: {base["best"]:.4f}s -> {result["best"]:.4f}s ({ratio:.2f}x)')
+    return regressions
+
+def print_results(results: List[BenchResult], formatter: tableformat.TableFormatter) -> None:
+    """
+    Print benchmark results as a table.
+    """
+    formatter.headings(['Benchmark', 'Rows', 'Best', 'Mean', 'Rows/s'])
+    for r in results:
+        formatter.row([r.name, str(r.rows), f'{r.best:0.4f}', f'{r.mean:0.4f}', f'{r.rows / r.best:0.0f}'])
+
+def main():
+
+    # Declare the argparser
+    parser = argparse.ArgumentParser(description="Run the porty benchmark suite.")
+    parser.add_argument("--only",      type=str, nargs='*', default=['*'], help="Glob patterns of benchmarks to run")
+    parser.add_argument("--sizes",     type=int, nargs='*', default=SIZES, help="Row counts to run at")
+    parser.add_argument("--repeat",    type=int, default=3, help="Number of timed runs per benchmark")
+    parser.add_argument("--seed",      type=int, default=0, help="Seed for the synthetic data")
+    parser.add_argument("--save",      type=Path, help="Save the results as JSON to this file")
+    parser.add_argument("--baseline",  type=Path, help="Compare the results against this JSON file")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed relative slowdown before failing")
+    parser.add_argument("--fmt",       type=str, default='txt', help="The table format")
+    args = parser.parse_args()
+
+    # Select and run the benchmarks
+    names = [name for name in BENCHMARKS if any(fnmatch.fnmatch(name, p) for p in args.only)]
+    results = run_all(names, args.sizes, args.repeat, args.seed)
+    print_results(results, tableformat.create_formatter(args.fmt))
+
+    # Save the results
+    current = to_json(results)
+    if args.save:
+        args.save.write_text(json.dumps(current, indent=2))
+
+    # Check for regressions
+    if args.baseline:
+        regressions = compare(current, json.loads(args.baseline.read_text()), args.threshold)
+        for line in regressions:
+            print('REGRESSION', line, file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+# If you know you know ;)
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+# client.py
+
+import argparse
+import json
+import os
+import socket
+import sys
+from pathlib import Path
+from typing import Optional
+
+# The socket used when none is given. Only the standard library is imported
+# by the client, so that it starts quickly.
+DEFAULT_SOCKET = os.environ.get('PORTY_SOCKET', '/tmp/porty.sock')
+
+class ReportError(Exception):
+    pass
+
+class ReportClient:
+    """
+    A connection to a running report server.
+
+    The connection is kept open so that several reports can be requested
+    without paying for a new connection each time.
+    """
+    def __init__(self, socket_path: str = DEFAULT_SOCKET):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(socket_path)
+        self.rfile = self.sock.makefile('rb')
+
+    def report(self, portfolio: str, prices: Optional[str] = None, fmt: str = 'txt') -> str:
+        """
+        Request a formatted report.
+
+        Args:
+            portfolio (str): A portfolio id registered with the server or a portfolio file path.
+            prices (str, optional): A prices file path. Defaults to the server's prices file.
+            fmt (str): The table format.
+
+        Returns:
+            str: The formatted report.
+        """
+        request = {'portfolio': portfolio, 'prices': prices, 'fmt': fmt}
+        self.sock.sendall(json.dumps(request).encode() + b'\n')
+        line = self.rfile.readline()
+        if not line:
+            raise ReportError('Server closed the connection')
+        response = json.loads(line)
+        if not response['ok']:
+            raise ReportError(response['error'])
+        return response['report']
+
+    def close(self) -> None:
+        self.rfile.close()
+        self.sock.close()
+
+    def __enter__(self) -> "ReportClient":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+def main():
+
+    # Declare the argparser
+    parser = argparse.ArgumentParser(description="Request a report from a running porty report server.")
+    parser.add_argument("portfolio", type=str, help="Portfolio id or path to the portfolio file")
+    parser.add_argument("prices",    type=str, nargs='?', help="Path to the prices file (default: the server's)")
+    parser.add_argument("fmt",       type=str, nargs='?', default='txt', help="The table format")
+    parser.add_argument("--socket",  type=str, default=DEFAULT_SOCKET, help="Path of the server socket")
+    args = parser.parse_args()
+
+    # Paths are resolved by the server, so make relative paths absolute here
+    portfolio = args.portfolio
+    if Path(portfolio).exists():
+        portfolio = str(Path(portfolio).resolve())
+    prices = str(Path(args.prices).resolve()) if args.prices else None
+
+    # Request the report
+    try:
+        with ReportClient(args.socket) as client:
+            sys.stdout.write(client.report(portfolio, prices, args.fmt))
+    except (OSError, ReportError) as e:
+        print(f'report-client: {e}', file=sys.stderr)
+        sys.exit(1)
+
+# If you know you know ;)
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+# datagen.py
+
+import argparse
+import bz2
+import datetime
+import functools
+import gzip
+import lzma
+import math
+import multiprocessing
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# Compression functions by name. Every chunk is compressed on its own and the
+# resulting streams are concatenated, which all three formats read back as one file.
+COMPRESSORS: Dict[str, Callable[[bytes], bytes]] = {
+    'gzip': lambda data: gzip.compress(data, compresslevel=6),
+    'bz2':  lambda data: bz2.compress(data, compresslevel=9),
+    'xz':   lambda data: lzma.compress(data),
+}
+
+# File extensions that imply a compression format
+EXTENSIONS = { '.gz': 'gzip', '.bz2': 'bz2', '.xz': 'xz' }
+
+# The first trading day and the length of a trading day in the tick files
+START_DATE = datetime.date(2007, 6, 11)
+OPEN_MINUTE = 9*60 + 30
+MINUTES_PER_DAY = 390
+
+def symbol(n: int) -> str:
+    '''
+    Make a stock symbol out of a number (0 -> 'A', 25 -> 'Z', 26 -> 'BA', ...).
+    '''
+    letters = ''
+    while True:
+        n, rem = divmod(n, 26)
+        letters = chr(ord('A') + rem) + letters
+        if n == 0:
+            return letters
+
+def format_date(day: int) -> str:
+    '''
+    Format a trading day offset as a "6/11/2007" style date.
+    '''
+    d = START_DATE + datetime.timedelta(days=day)
+    return f'{d.month}/{d.day}/{d.year}'
+
+def format_time(minute: int) -> str:
+    '''
+    Format minutes past midnight as a "9:50am" style time.
+    '''
+    hour, minute = divmod(minute, 60)
+    return f'{hour % 12 or 12}:{minute:02d}{"am" if hour < 12 else "pm"}'
+
+def _base_prices(seed: int, nsymbols: int) -> List[float]:
+    '''
+    The reference price of every symbol, identical in every worker.
+    '''
+    rng = random.Random(f'{seed}-base')
+    return [round(rng.uniform(5, 500), 2) for _ in range(nsymbols)]
+
+@functools.lru_cache(maxsize=8)
+def _symbols(nsymbols: int) -> List[str]:
+    '''
+    The quoted names of the first nsymbols symbols, built once per process.
+    '''
+    return [f'"{symbol(n)}"' for n in range(nsymbols)]
+
+# Quoted trading times, indexed by minute since the open
+_TIMES = [f'"{format_time(OPEN_MINUTE + m)}"' for m in range(MINUTES_PER_DAY)]
+
+@functools.lru_cache(maxsize=4096)
+def _date(day: int) -> str:
+    return f'"{format_date(day)}"'
+
+def _portfolio_rows(rng: random.Random, start: int, count: int, nsymbols: int, dirty: float) -> Iterator[str]:
+    for name in rng.choices(_symbols(nsymbols), k=count):
+        shares = '' if rng.random() < dirty else rng.randrange(1, 1000)
+        yield f'{name},{shares},{rng.uniform(1, 500):0.2f}\n'
+
+def _prices_rows(rng: random.Random, start: int, count: int, nsymbols: int, dirty: float) -> Iterator[str]:
+    for n in range(start, start + count):
+        price = '' if rng.random() < dirty else f'{rng.uniform(1, 500):0.2f}'
+        yield f'"{symbol(n % nsymbols)}",{price}\n'
+
+def _portfoliodate_rows(rng: random.Random, start: int, count: int, nsymbols: int, dirty: float) -> Iterator[str]:
+    for name in rng.choices(_symbols(nsymbols), k=count):
+        date = _date(rng.randrange(3650))
+        tm = _TIMES[rng.randrange(MINUTES_PER_DAY)]
+        shares = '' if rng.random() < dirty else rng.randrange(1, 1000)
+        yield f'{name},{date},{tm},{shares},{rng.uniform(1, 500):0.2f}\n'
+
+def _yaml_rows(rng: random.Random, start: int, count: int, nsymbols: int, dirty: float) -> Iterator[str]:
+    for name in rng.choices(_symbols(nsymbols), k=count):
+        shares = '' if rng.random() < dirty else rng.randrange(1, 1000)
+        yield f'  - name: {name}\n    shares: {shares}\n    price: {rng.uniform(1, 500):0.2f}\n'
+
+def _ticks_rows(rng: random.Random, start: int, count: int, nsymbols: int, dirty: float, seed: int = 0) -> Iterator[str]:
+    # Every minute each symbol ticks once, so rows are already in time order
+    base = _base_prices(seed, nsymbols)
+    names = _symbols(nsymbols)
+    for n in range(start, start + count):
+        minute, sym = divmod(n, nsymbols)
+        day, minute = divmod(minute, MINUTES_PER_DAY)
+        open_ = base[sym]
+        price = open_ * (1 + 0.05 * math.sin(minute / 60 + sym)) + rng.uniform(-0.5, 0.5)
+        low, high = min(open_, price) - 0.1, max(open_, price) + 0.1
+        price = '' if rng.random() < dirty else f'{price:0.2f}'
+        yield (f'{names[sym]},{price},{_date(day)},{_TIMES[minute]},'
+               f'{rng.uniform(-2, 2):+0.2f},{open_:0.2f},{high:0.2f},{low:0.2f},{rng.randrange(1000, 1000000)}\n')
+
+# Kind -> (header, row generator)
+KINDS: Dict[str, Tuple[str, Callable]] = {
+    'portfolio':     ('name,shares,price\n', _portfolio_rows),
+    'prices':        ('', _prices_rows),
+    'portfoliodate': ('name,date,time,shares,price\n', _portfoliodate_rows),
+    'yaml':          ('stocks:\n', _yaml_rows),
+    'ticks':         ('name,price,date,time,change,open,high,low,volume\n', _ticks_rows),
+}
+
+def _make_chunk(task: tuple) -> bytes:
+    '''
+    Generate (and optionally compress) one chunk of rows.
+
+    Each chunk has its own random stream derived from the seed and the chunk
+    position, so the output does not depend on the number of workers.
+    '''
+    kind, seed, start, count, nsymbols, dirty, compression = task
+    rng = random.Random(f'{seed}-{kind}-{start}')
+    _, rows = KINDS[kind]
+    if kind == 'ticks':
+        lines = rows(rng, start, count, nsymbols, dirty, seed)
+    else:
+        lines = rows(rng, start, count, nsymbols, dirty)
+    data = ''.join(lines).encode()
+    return COMPRESSORS[compression](data) if compression else data
+
+def generate(kind: str, filename: Path, nrows: int, nsymbols: int = 500, seed: int = 0,
+             dirty: float = 0.0, compression: Optional[str] = None, chunk_rows: int = 250_000,
+             workers: int = 1) -> int:
+    """
+    Write a synthetic data file.
+
+    Args:
+        kind (str): One of 'portfolio', 'prices', 'portfoliodate', 'yaml' or 'ticks'.
+        filename (Path): The file to write.
+        nrows (int): The number of data rows.
+        nsymbols (int): The number of distinct stock symbols.
+        seed (int): Seed making the output reproducible.
+        dirty (float): Fraction of rows with a missing numeric field (like missing.csv).
+        compression (str, optional): 'gzip', 'bz2' or 'xz'. Inferred from the file extension if None.
+        chunk_rows (int): The number of rows generated per chunk.
+        workers (int): The number of processes generating chunks.
+
+    Returns:
+        int: The number of bytes written.
+    """
+    if kind not in KINDS:
+        raise ValueError(f'Unknown data kind {kind}')
+    if compression is None:
+        compression = EXTENSIONS.get(Path(filename).suffix)
+    if compression is not None and compression not in COMPRESSORS:
+        raise ValueError(f'Unknown compression {compression}')
+
+    # Split the rows into chunks
+    header, _ = KINDS[kind]
+    tasks = [(kind, seed, start, min(chunk_rows, nrows - start), nsymbols, dirty, compression)
+             for start in range(0, nrows, chunk_rows)]
+
+    written = 0
+    with open(filename, 'wb') as f:
+
+        # Write the header as its own stream
+        if header:
+            data = header.encode()
+            written += f.write(COMPRESSORS[compression](data) if compression else data)
+
+        # Write the chunks in their original order
+        if workers > 1:
+            with multiprocessing.Pool(workers) as pool:
+                for data in pool.imap(_make_chunk, tasks):
+                    written += f.write(data)
+        else:
+            for task in tasks:
+                written += f.write(_make_chunk(task))
+    return written
+
+def main():
+
+    # Declare the argparser
+    parser = argparse.ArgumentParser(description="Generate synthetic portfolio, price and tick data.")
+    parser.add_argument("kind",          type=str, choices=sorted(KINDS), help="The kind of file to generate")
+    parser.add_argument("filename",      type=Path, help="Path to the output file")
+    parser.add_argument("--rows",        type=int, default=1000, help="Number of data rows")
+    parser.add_argument("--symbols",     type=int, default=500, help="Number of distinct symbols")
+    parser.add_argument("--seed",        type=int, default=0, help="Random seed")
+    parser.add_argument("--dirty",       type=float, default=0.0, help="Fraction of rows with a missing field")
+    parser.add_argument("--compression", type=str, choices=sorted(COMPRESSORS), help="Compression (default: from the extension)")
+    parser.add_argument("--chunk-rows",  type=int, default=250_000, help="Rows generated per chunk")
+    parser.add_argument("--workers",     type=int, default=multiprocessing.cpu_count(), help="Number of worker processes")
+    args = parser.parse_args()
+
+    # Generate the file
+    start = time.perf_counter()
+    written = generate(args.kind, args.filename, args.rows, args.symbols, args.seed, args.dirty,
+                       args.compression, args.chunk_rows, args.workers)
+    elapsed = time.perf_counter() - start
+    print(f'{args.rows} rows, {written / 1e6:0.1f} MB in {elapsed:0.2f}s '
+          f'({args.rows / elapsed:0.0f} rows/s)', file=sys.stderr)
+
+# If you know you know ;)
+if __name__ == '__main__':
+    main()
@@ -2,9 +2,131 @@
 
 import yaml
 import csv
-from typing import Any, List, Dict, Tuple, Type, Union
+import datetime
+import functools
+from collections import namedtuple
+from typing import Any, List, Dict, Iterator, Optional, TextIO, Tuple, Type, Union
 
-def parse_csv(lines: Any, select: List[str] = None, types: List[Type] = None, has_headers: bool = True, delimiter: str = ',', silence_errors: bool = False) -> List[Union[Dict[str, Any], Tuple]]:
+# Use the libyaml-backed loader when PyYAML was built with it
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+# The ordinal of the day parse_date counts from
+_EPOCH = datetime.date(1970, 1, 1).toordinal()
+
+# Date and time columns have few distinct values compared with their row count,
+# so the conversions below are memoized on the raw string
+@functools.lru_cache(maxsize=65536)
+def parse_date(value: str) -> int:
+    '''
+    Column type converting a "6/11/2007" style date to days since 1970-01-01.
+    '''
+    month, day, year = value.split('/')
+    return datetime.date(int(year), int(month), int(day)).toordinal() - _EPOCH
+
+@functools.lru_cache(maxsize=4096)
+def parse_time(value: str) -> int:
+    '''
+    Column type converting a "9:50am" style time to minutes past midnight.
+    '''
+    am_pm = value[-2:].lower()
+    if am_pm not in ('am', 'pm'):
+        raise ValueError(f'invalid time: {value!r}')
+    hour, minute = value[:-2].split(':')
+    hour, minute = int(hour), int(minute)
+    if not (0 <= hour <= 12 and 0 <= minute <= 59):
+        raise ValueError(f'invalid time: {value!r}')
+    return (hour % 12 + (12 if am_pm == 'pm' else 0)) * 60 + minute
+
+def format_date(day: int) -> str:
+    '''
+    Format days since 1970-01-01 back as a "6/11/2007" style date.
+    '''
+    d = datetime.date.fromordinal(day + _EPOCH)
+    return f'{d.month}/{d.day}/{d.year}'
+
+# A row that could not be converted: its number in the file, its raw fields,
+# the column that failed and the exception raised
+BadRow = namedtuple('BadRow', ['row_num', 'fields', 'column', 'error_type', 'message'])
+
+class ErrorLog:
+    """
+    Collects the rows parse_csv could not convert.
+
+    Every bad row is counted by kind, a (column, exception type) pair, and the
+    first few rows of each kind are kept as samples. With a rejects file, every
+    bad row is also written there as CSV, under the headers of the input, so it
+    can be fixed and parsed again.
+    """
+    def __init__(self, max_samples: int = 10, rejects: Optional[TextIO] = None, delimiter: str = ','):
+        self.max_samples = max_samples
+        self.counts: Dict[Tuple[str, str], int] = {}
+        self.samples: Dict[Tuple[str, str], List[BadRow]] = {}
+        self.rejects = csv.writer(rejects, delimiter=delimiter) if rejects is not None else None
+
+    def headers(self, headers: List[str]) -> None:
+        '''
+        Called by parse_csv with the headers of the input before any row.
+        '''
+        if self.rejects is not None and headers:
+            self.rejects.writerow(headers)
+
+    def add(self, row_num: int, fields: List[str], column: str, error: Exception) -> None:
+        """
+        Record a bad row.
+
+        Args:
+            row_num (int): The number of the row in the file (the first data row is 1).
+            fields (List[str]): The raw fields of the row, before any selection.
+            column (str): The name (or index) of the column that failed to convert.
+            error (Exception): The exception raised by the conversion.
+        """
+        kind = (column, type(error).__name__)
+        count = self.counts.get(kind, 0)
+        self.counts[kind] = count + 1
+        if count < self.max_samples:
+            self.samples.setdefault(kind, []).append(BadRow(row_num, fields, column, kind[1], str(error)))
+        if self.rejects is not None:
+            self.rejects.writerow(fields)
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+    def __bool__(self) -> bool:
+        return bool(self.counts)
+
+    def summary(self) -> List[str]:
+        '''
+        Describe the bad rows: a count per kind, followed by its first sample (if any was kept).
+        '''
+        lines = []
+        for kind, count in self.counts.items():
+            line = f"{count} rows: couldn't convert column {kind[0]} ({kind[1]})"
+            samples = self.samples.get(kind)
+            if samples:
+                line += f", e.g. row {samples[0].row_num} {samples[0].fields}: {samples[0].message}"
+            lines.append(line)
+        return lines
+
+def _bad_column(types: List[Type], row: List[str], headers: List[str]) -> Tuple[str, Exception]:
+    '''
+    Find the first column of a bad row that fails to convert, and its exception.
+    '''
+    for i, (func, val) in enumerate(zip(types, row)):
+        try:
+            func(val)
+        except ValueError as e:
+            return (headers[i] if i < len(headers) else str(i)), e
+    return '', ValueError('unknown conversion error')
+
+# The types of the where tests that check membership rather than equality
+_CONTAINERS = (set, frozenset, list, tuple, dict)
+
+def parse_csv(lines: Any, select: List[str] = None, types: List[Type] = None, has_headers: bool = True, delimiter: str = ',', silence_errors: bool = False,
+              errors: Optional[ErrorLog] = None, where: Dict[Union[str, int], Any] = None) -> List[Union[Dict[str, Any], Tuple]]:
     '''
     Parse a CSV file into a list of records with type conversion.
 
@@ -15,6 +137,12 @@ def parse_csv(lines: Any, select: List[str] = None, types: List[Type] = None, ha
         has_headers (bool): Whether the CSV file includes a header row. Defaults to True.
         delimiter (str): Column delimiter used in the file. Defaults to ','.
         silence_errors (bool): Whether to silence the errors raised during the operation.
+        errors (ErrorLog, optional): Collect the rows that fail to convert here instead of printing them.
+        where (Dict, optional): Only keep the rows whose raw (unconverted) fields pass every test, keyed by
+            column name, or by column index without headers. A test is either a predicate called with the
+            field, a set, frozenset, list, tuple or dict the field must be in, or a value the field must equal
+            (compared as a string). Any column can be tested, selected or not. Rows too short to have a tested
+            column are reported as bad rows.
 
     Returns:
         List[Union[Dict[str, Any], Tuple]]: A list of records as dictionaries if headers are present, or as tuples if not.
@@ -29,20 +157,52 @@ def parse_csv(lines: Any, select: List[str] = None, types: List[Type] = None, ha
     rows = csv.reader(lines, delimiter=delimiter)
 
     # Read the file headers (if any)
-    headers = next(rows) if has_headers else []
+    headers = raw_headers = next(rows) if has_headers else []
 
     # If specific columns have been selected, make indices for filtering and set output columns
     if select:
         indices = [ headers.index(colname) for colname in select ]
         headers = select
 
+    if errors is not None:
+        errors.headers(raw_headers)
+
+    # Turn the filters into (column index, test) pairs, with the cheap membership and equality tests first
+    members, predicates = [], []
+    for column, test in (where or {}).items():
+        index = raw_headers.index(column) if has_headers else column
+        if callable(test):
+            predicates.append((index, test))
+        elif isinstance(test, _CONTAINERS):
+            members.append((index, test.__contains__))
+        else:
+            members.append((index, str(test).__eq__))
+    tests = members + predicates
+    width = max((index for index, _ in tests), default=-1) + 1
+
     for row_num, row in enumerate(rows, 1):
         
         # Skip rows with no data
         if not row:
             continue
 
+        # Drop the rows filtered out before doing any conversion
+        if tests:
+            if len(row) < width:
+                missing = min(index for index, _ in tests if index >= len(row))
+                column = raw_headers[missing] if has_headers else missing
+                error = IndexError(f'no field {column}, the row has {len(row)} fields')
+                if errors is not None:
+                    errors.add(row_num, row, column, error)
+                elif not silence_errors:
+                    print(f"Row {row_num}: Couldn't filter {row}")
+                    print(f"Row {row_num}: Reason {error}")
+                continue
+            if not all(test(row[index]) for index, test in tests):
+                continue
+
         # If specific column indices are selected, pick them out
+        fields = row
         if select:
             row = [row[index] for index in indices]
 
@@ -51,7 +211,9 @@ def parse_csv(lines: Any, select: List[str] = None, types: List[Type] = None, ha
             try:
                 row = [func(val) for func, val in zip(types, row)]
             except ValueError as e:
-                if not silence_errors:
+                if errors is not None:
+                    errors.add(row_num, fields, *_bad_column(types, row, headers))
+                elif not silence_errors:
                     print(f"Row {row_num}: Couldn't convert {row}")
                     print(f"Row {row_num}: Reason {e}")
                 continue
@@ -71,4 +233,16 @@ def parse_yaml(lines: Any) -> Dict[Any, Any]:
     Returns:
         Dict[Any, Any]: Parsed data as a dictionary.
     """
-    return yaml.safe_load(lines)
+    return yaml.load(lines, Loader=SafeLoader)
+
+def parse_yaml_all(lines: Any) -> Iterator[Any]:
+    """
+    Lazily parse every document of a multi-document YAML stream.
+
+    Parameters:
+        lines (Any): A file-like object or string containing YAML-formatted data.
+
+    Returns:
+        Iterator[Any]: The parsed documents, one at a time.
+    """
+    return yaml.load_all(lines, Loader=SafeLoader)
@@ -0,0 +1,237 @@
+# history.py
+
+import argparse
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import porty.fileparse as fileparse
+import porty.report as report
+import porty.tableformat as tableformat
+
+# Minutes in a calendar day
+MINUTES_PER_DAY = 24 * 60
+
+def timestamp(date: str, time: str) -> int:
+    '''
+    Convert a "6/11/2007" date and a "9:50am" time to minutes since 1970-01-01.
+    '''
+    return fileparse.parse_date(date) * MINUTES_PER_DAY + fileparse.parse_time(time)
+
+def format_timestamp(t: int) -> str:
+    '''
+    Format minutes since 1970-01-01 as a "6/11/2007 9:50am" style string.
+    '''
+    day, minute = divmod(t, MINUTES_PER_DAY)
+    hour, minute = divmod(minute, 60)
+    return f'{fileparse.format_date(day)} {hour % 12 or 12}:{minute:02d}{"am" if hour < 12 else "pm"}'
+
+class PriceHistory:
+    """
+    The price history of many stocks, indexed by time.
+
+    Each symbol has a sorted array of timestamps (minutes since 1970-01-01) and
+    an array of the prices at those times, so as-of lookups and time ranges
+    are binary searches. Prices may be added in any order; a symbol's arrays
+    are sorted again on the first lookup after an out-of-order addition.
+    """
+    def __init__(self):
+        self.times: Dict[str, array] = {}
+        self.prices: Dict[str, array] = {}
+        self.unsorted: set = set()
+
+    def __len__(self) -> int:
+        return sum(len(times) for times in self.times.values())
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self.times
+
+    @property
+    def symbols(self) -> List[str]:
+        return list(self.times)
+
+    def add(self, symbol: str, t: int, price: float) -> None:
+        """
+        Record the price of a stock at a time.
+        """
+        times = self.times.get(symbol)
+        if times is None:
+            times = self.times[symbol] = array('q')
+            self.prices[symbol] = array('d')
+        if times and t < times[-1]:
+            self.unsorted.add(symbol)
+        times.append(t)
+        self.prices[symbol].append(price)
+
+    def _series(self, symbol: str) -> Tuple[array, array]:
+        '''
+        Get the (sorted) times and prices of a symbol.
+        '''
+        if symbol in self.unsorted:
+            pairs = sorted(zip(self.times[symbol], self.prices[symbol]), key=lambda p: p[0])
+            self.times[symbol] = array('q', (t for t, _ in pairs))
+            self.prices[symbol] = array('d', (p for _, p in pairs))
+            self.unsorted.discard(symbol)
+        return self.times[symbol], self.prices[symbol]
+
+    def price_as_of(self, symbol: str, t: int) -> Optional[float]:
+        """
+        Get the last price of a stock at or before a time.
+
+        Args:
+            symbol (str): The stock symbol.
+            t (int): The time, in minutes since 1970-01-01.
+
+        Returns:
+            float: The price, or None if the stock has no price by then.
+        """
+        if symbol not in self.times:
+            return None
+        times, prices = self._series(symbol)
+        i = bisect_right(times, t)
+        return prices[i-1] if i else None
+
+    def range(self, symbol: str, start: int, end: int) -> Tuple[array, array]:
+        """
+        Get the prices of a stock from a start time up to (not including) an end time.
+
+        Returns:
+            Tuple[array, array]: The times and prices in the range.
+        """
+        if symbol not in self.times:
+            return array('q'), array('d')
+        times, prices = self._series(symbol)
+        lo, hi = bisect_left(times, start), bisect_left(times, end)
+        return times[lo:hi], prices[lo:hi]
+
+    def last_time(self) -> Optional[int]:
+        """
+        Get the time of the latest price of any stock.
+        """
+        return max((self._series(symbol)[0][-1] for symbol in self.times), default=None)
+
+    def prices_as_of(self, t: int) -> Dict[str, float]:
+        """
+        Get the prices of every stock as of a time, as a price table for make_report.
+        """
+        table = {}
+        for symbol in self.times:
+            price = self.price_as_of(symbol, t)
+            if price is not None:
+                table[symbol] = price
+        return table
+
+    def join_as_of(self, records: Iterable[Dict[str, Any]], name: str = 'name', time: str = 'time') -> List[Optional[float]]:
+        """
+        Find the price as of each record's time, for many records at once.
+
+        The records are grouped by symbol and the times of each group are
+        looked up in time order, each search starting where the last one ended.
+
+        Args:
+            records: Dicts holding a symbol and a time (in minutes since 1970-01-01).
+            name (str): The key of the symbol.
+            time (str): The key of the time.
+
+        Returns:
+            List[Optional[float]]: The price as of each record, in the order of the records.
+        """
+        groups: Dict[str, List[Tuple[int, int]]] = {}
+        count = 0
+        for i, record in enumerate(records):
+            groups.setdefault(record[name], []).append((record[time], i))
+            count += 1
+
+        result: List[Optional[float]] = [None] * count
+        for symbol, queries in groups.items():
+            if symbol not in self.times:
+                continue
+            times, prices = self._series(symbol)
+            queries.sort()
+            j = 0
+            for t, i in queries:
+                j = bisect_right(times, t, j)
+                if j:
+                    result[i] = prices[j-1]
+        return result
+
+def read_history(filename: Path, errors: fileparse.ErrorLog = None) -> PriceHistory:
+    """
+    Read a tick log (like dowstocks.csv) into a PriceHistory.
+
+    Args:
+        filename (Path): Path to a CSV file with name, price, date and time columns.
+        errors (ErrorLog, optional): Collect the rows that fail to convert here instead of printing them.
+
+    Returns:
+        PriceHistory: The price history of every stock in the file.
+    """
+    history = PriceHistory()
+    with open(filename) as lines:
+        rows = fileparse.parse_csv(lines, select=['name', 'price', 'date', 'time'],
+                                   types=[str, float, fileparse.parse_date, fileparse.parse_time], errors=errors)
+    for row in rows:
+        history.add(row['name'], row['date'] * MINUTES_PER_DAY + row['time'], row['price'])
+    return history
+
+def read_dated_portfolio(filename: Path) -> List[Dict[str, Any]]:
+    """
+    Read a dated portfolio (like portfoliodate.csv), with the purchase date and time as a timestamp.
+    """
+    with open(filename) as lines:
+        rows = fileparse.parse_csv(lines, select=['name', 'date', 'time', 'shares', 'price'],
+                                   types=[str, fileparse.parse_date, fileparse.parse_time, int, float])
+    for row in rows:
+        row['time'] += row.pop('date') * MINUTES_PER_DAY
+    return rows
+
+def _parse_at(text: str, parser: argparse.ArgumentParser) -> int:
+    '''
+    Parse the --at argument, a date and an optional time (by default, the end of the day).
+    '''
+    date, _, time = text.strip().partition(' ')
+    try:
+        return timestamp(date, time.strip() or '11:59pm')
+    except (ValueError, IndexError):
+        parser.error(f"--at expects a date and an optional time, like '6/11/2007 10:30am', not {text!r}")
+
+def main():
+
+    # Declare the argparser
+    parser = argparse.ArgumentParser(description="Report on a portfolio against a price history.")
+    parser.add_argument("history",   type=Path, help="Path to the tick log with the price history")
+    parser.add_argument("portfolio", type=Path, help="Path to the input portfolio file")
+    parser.add_argument("--at",      type=str, help="Report with the prices as of this time (e.g. '6/11/2007 10:30am', or a date for its close)")
+    parser.add_argument("--join",    action='store_true', help="Show the market price when each dated holding was bought")
+    parser.add_argument("--fmt",     type=str, default='txt', help="The table format")
+    args = parser.parse_args()
+
+    errors = fileparse.ErrorLog()
+    history = read_history(args.history, errors)
+    for line in errors.summary():
+        print(f'{args.history}: {line}', file=sys.stderr)
+    latest = history.last_time()
+    if latest is None:
+        print(f'{args.history}: no prices', file=sys.stderr)
+        sys.exit(1)
+    formatter = tableformat.create_formatter(args.fmt)
+
+    # Compare each purchase with the market price at the time
+    if args.join:
+        rows = read_dated_portfolio(args.portfolio)
+        formatter.headings(['Name', 'Bought', 'Shares', 'Price', 'Market'])
+        for row, market in zip(rows, history.join_as_of(rows)):
+            formatter.row([row['name'], format_timestamp(row['time']), str(row['shares']),
+                           f"{row['price']:0.2f}", '' if market is None else f'{market:0.2f}'])
+        return
+
+    # Report with the prices as of a time (by default, the latest prices)
+    at = _parse_at(args.at, parser) if args.at else latest
+    prices = history.prices_as_of(at)
+    report.print_report(report.make_report(report.read_portfolio(args.portfolio), prices), formatter)
+
+# If you know you know ;)
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,385 @@
+# journal.py
+
+import argparse
+import os
+import struct
+import sys
+import time
+import zlib
+from pathlib import Path
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+
+from porty.portfolio import Portfolio
+from porty.stock import Stock
+
+# A journal record: sequence number, operation (b'B'uy or b'S'ell), symbol,
+# shares, price and the CRC32 of all of the above
+_RECORD = struct.Struct('<Qc15sqd')
+_CRC = struct.Struct('<I')
+RECORD_SIZE = _RECORD.size + _CRC.size
+
+# A snapshot: a header (magic, sequence number, holdings count), one
+# (symbol, shares, price) record per holding and the CRC32 of everything before it
+_SNAPSHOT_MAGIC = b'PORTYSNP'
+_SNAPSHOT_HEADER = struct.Struct('<8sQQ')
+_HOLDING = struct.Struct('<15sqd')
+
+def _segment_name(seq: int) -> str:
+    return f'journal-{seq:020d}.log'
+
+def _snapshot_name(seq: int) -> str:
+    return f'snapshot-{seq:020d}.snap'
+
+def _seq_of(path: Path) -> int:
+    return int(path.stem.split('-')[1])
+
+def _encode_name(name: str) -> bytes:
+    data = name.encode()
+    if len(data) > 15:
+        raise ValueError(f'Symbol too long for the journal: {name!r}')
+    return data
+
+def _fsync_dir(directory: Path) -> None:
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def check_trade(portfolio: Portfolio, op: bytes, name: str, shares: int) -> None:
+    """
+    Check that a trade can be applied to a portfolio, without applying it.
+
+    Raises:
+        ValueError: If the trade is malformed or sells more shares than are held.
+    """
+    if shares <= 0:
+        raise ValueError(f'Cannot trade {shares} shares')
+    if op not in (b'B', b'S'):
+        raise ValueError(f'Unknown trade {op!r}')
+    if op == b'S' and shares > portfolio.shares(name):
+        raise ValueError(f'Cannot sell {shares} shares of {name}, only {portfolio.shares(name)} held')
+
+def apply_trade(portfolio: Portfolio, op: bytes, name: str, shares: int, price: float) -> int:
+    """
+    Apply a trade to a portfolio.
+
+    A buy adds a new holding. A sell takes the shares from the oldest holdings
+    of the stock first. Like Stock.sell, it leaves the holdings it sells out in
+    the portfolio, with no shares.
+
+    Args:
+        portfolio (Portfolio): The portfolio to update.
+        op (bytes): b'B' for a buy, b'S' for a sell.
+        name (str): The stock symbol.
+        shares (int): The number of shares traded.
+        price (float): The price per share (of a buy).
+
+    Returns:
+        int: The number of holdings sold out by the trade.
+    """
+    check_trade(portfolio, op, name, shares)
+    if op == b'B':
+        portfolio.stocks.append(Stock(name=name, shares=shares, price=price))
+        return 0
+    sold_out = 0
+    for stock in portfolio[name]:
+        if stock.shares == 0:
+            continue
+        sold = min(stock.shares, shares)
+        stock.sell(sold)
+        shares -= sold
+        sold_out += stock.shares == 0
+        if shares == 0:
+            break
+    return sold_out
+
+def _replay(portfolio: Portfolio, sold_out: int, trade: tuple) -> int:
+    '''
+    Apply a trade, dropping the sold out holdings in one pass once they are a quarter of the portfolio.
+
+    Returns the number of sold out holdings left in the portfolio.
+    '''
+    sold_out += apply_trade(portfolio, *trade)
+    if sold_out * 4 > len(portfolio.stocks):
+        portfolio.stocks = [s for s in portfolio.stocks if s.shares]
+        sold_out = 0
+    return sold_out
+
+def _sold_out(portfolio: Portfolio) -> int:
+    return sum(1 for s in portfolio.stocks if s.shares == 0)
+
+def read_records(f: BinaryIO) -> Iterator[Tuple[int, bytes, str, int, float]]:
+    """
+    Read the records of a journal segment, stopping at the first torn or corrupt one.
+
+    Args:
+        f (BinaryIO): The segment file.
+
+    Returns:
+        Iterator: (seq, op, name, shares, price) per record.
+    """
+    while True:
+        data = f.read(RECORD_SIZE * 4096)
+        for offset in range(0, len(data) - RECORD_SIZE + 1, RECORD_SIZE):
+            body = data[offset:offset + _RECORD.size]
+            if _CRC.unpack_from(data, offset + _RECORD.size)[0] != zlib.crc32(body):
+                return
+            seq, op, name, shares, price = _RECORD.unpack(body)
+            yield seq, op, name.rstrip(b'\0').decode(), shares, price
+        if len(data) < RECORD_SIZE * 4096:
+            return
+
+def write_snapshot(directory: Path, portfolio: Portfolio, seq: int) -> Path:
+    """
+    Atomically write a snapshot of a portfolio as of a journal sequence number.
+
+    Returns:
+        Path: The snapshot file.
+    """
+    parts = [_SNAPSHOT_HEADER.pack(_SNAPSHOT_MAGIC, seq, len(portfolio.stocks))]
+    parts.extend(_HOLDING.pack(_encode_name(s.name), s.shares, s.price) for s in portfolio.stocks)
+    data = b''.join(parts)
+    path = directory / _snapshot_name(seq)
+    tmp = path.with_suffix('.tmp')
+    with open(tmp, 'wb') as f:
+        f.write(data)
+        f.write(_CRC.pack(zlib.crc32(data)))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    _fsync_dir(directory)
+    return path
+
+def read_snapshot(path: Path) -> Optional[Tuple[Portfolio, int]]:
+    """
+    Load a snapshot, or return None when it is incomplete or corrupt.
+
+    Returns:
+        Tuple[Portfolio, int]: The portfolio and the sequence number of the last trade in it.
+    """
+    data = path.read_bytes()
+    if len(data) < _SNAPSHOT_HEADER.size + _CRC.size:
+        return None
+    body, (crc,) = data[:-_CRC.size], _CRC.unpack(data[-_CRC.size:])
+    magic, seq, count = _SNAPSHOT_HEADER.unpack_from(body)
+    if magic != _SNAPSHOT_MAGIC or crc != zlib.crc32(body) or len(body) != _SNAPSHOT_HEADER.size + count * _HOLDING.size:
+        return None
+    stocks = [Stock(name=name.rstrip(b'\0').decode(), shares=shares, price=price)
+              for name, shares, price in _HOLDING.iter_unpack(body[_SNAPSHOT_HEADER.size:])]
+    return Portfolio(stocks=stocks), seq
+
+def recover(directory: Path) -> Tuple[Portfolio, int]:
+    """
+    Rebuild a portfolio from its journal directory.
+
+    The newest valid snapshot is loaded and only the trades journaled after it
+    are replayed, so recovery time depends on the snapshot interval, not on
+    the length of the history. Replay stops at the first torn record, which
+    was never acknowledged as committed.
+
+    Args:
+        directory (Path): The journal directory.
+
+    Returns:
+        Tuple[Portfolio, int]: The portfolio and the sequence number of the last trade applied.
+    """
+    portfolio, seq, _ = _recover(directory)
+    return portfolio, seq
+
+def _recover(directory: Path) -> Tuple[Portfolio, int, Optional[Tuple[Path, int]]]:
+    '''
+    Recover a portfolio, also returning the last segment and the length of its valid records.
+    '''
+    portfolio, seq, tail = Portfolio(stocks=[]), 0, None
+    for path in sorted(directory.glob('snapshot-*.snap'), reverse=True):
+        loaded = read_snapshot(path)
+        if loaded is not None:
+            portfolio, seq = loaded
+            break
+
+    sold_out = _sold_out(portfolio)
+    for path in sorted(directory.glob('journal-*.log')):
+        records = 0
+        with open(path, 'rb') as f:
+            for record_seq, op, name, shares, price in read_records(f):
+                records += 1
+                if record_seq <= seq:
+                    continue
+                if record_seq != seq + 1:
+                    raise RuntimeError(f'{path}: expected trade {seq + 1}, found {record_seq}')
+                sold_out = _replay(portfolio, sold_out, (op, name, shares, price))
+                seq = record_seq
+        tail = (path, records * RECORD_SIZE)
+    return portfolio, seq, tail
+
+class Journal:
+    """
+    An append-only journal of the trades made on a portfolio.
+
+    Trades are applied to the in-memory portfolio and encoded as fixed-size
+    binary records. Records are written and fsync()ed in groups (group
+    commit): a trade is durable once commit() has returned, which happens
+    automatically every `group` trades. Every `snapshot_every` trades the
+    portfolio is snapshotted and the segments before it are deleted, which
+    bounds both the disk used and the work done by recovery.
+
+    Each trade is checked, logged and only then applied to the portfolio.
+    The portfolio must only be changed through buy() and sell(): changes
+    made to it directly are not journaled and are lost on recovery. If a
+    commit fails, the journal refuses further trades; reopening it recovers
+    the trades that reached the disk.
+    """
+    def __init__(self, directory: Path, group: int = 1000, segment_bytes: int = 64 * 1024 * 1024,
+                 snapshot_every: Optional[int] = 1_000_000):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.group = group
+        self.segment_bytes = segment_bytes
+        self.snapshot_every = snapshot_every
+        self.portfolio, self.seq, tail = _recover(self.directory)
+        self.sold_out = _sold_out(self.portfolio)
+        self.snapshot_seq = self.seq
+        self.pending: List[bytes] = []
+        self.segment: Optional[BinaryIO] = None
+        self.failed = False
+
+        # Keep appending to the last segment when it ends with the last trade
+        # recovered, dropping any torn record after it
+        if tail is not None and tail[1] < segment_bytes and \
+                _seq_of(tail[0]) + tail[1] // RECORD_SIZE == self.seq + 1:
+            self.segment = open(tail[0], 'r+b')
+            self.segment.truncate(tail[1])
+            self.segment.seek(tail[1])
+        else:
+            self._rotate()
+
+    def _rotate(self) -> None:
+        '''
+        Start a new segment with the next trade.
+
+        A torn tail of the old segment is left behind and ignored. A segment
+        already named after the next trade holds no committed trades, so it is
+        truncated.
+        '''
+        if self.segment is not None:
+            self.segment.close()
+        self.segment = open(self.directory / _segment_name(self.seq + 1), 'wb')
+        _fsync_dir(self.directory)
+
+    def _trade(self, op: bytes, name: str, shares: int, price: float) -> int:
+        '''
+        Check a trade, log it, then apply it to the portfolio.
+        '''
+        if self.failed:
+            raise RuntimeError('A commit of the journal failed: reopen it to recover')
+        check_trade(self.portfolio, op, name, shares)
+        record = _RECORD.pack(self.seq + 1, op, _encode_name(name), shares, price)
+        self.pending.append(record + _CRC.pack(zlib.crc32(record)))
+        self.seq += 1
+        if len(self.pending) >= self.group:
+            self.commit()
+        self.sold_out = _replay(self.portfolio, self.sold_out, (op, name, shares, price))
+        if self.snapshot_every and self.seq - self.snapshot_seq >= self.snapshot_every:
+            self.snapshot()
+        return self.seq
+
+    def buy(self, name: str, shares: int, price: float) -> int:
+        """
+        Buy shares of a stock as a new holding.
+
+        Returns:
+            int: The sequence number of the trade.
+        """
+        return self._trade(b'B', name, shares, price)
+
+    def sell(self, name: str, shares: int) -> int:
+        """
+        Sell shares of a stock, from its oldest holdings first.
+
+        Sold out holdings stay in the portfolio, with no shares, until they
+        make up a quarter of it and are all dropped at once.
+
+        Returns:
+            int: The sequence number of the trade.
+        """
+        return self._trade(b'S', name, shares, 0.0)
+
+    def commit(self) -> None:
+        """
+        Write the pending trades and wait for them to reach the disk.
+        """
+        if self.failed:
+            raise RuntimeError('A commit of the journal failed: reopen it to recover')
+        if not self.pending:
+            return
+        try:
+            self.segment.write(b''.join(self.pending))
+            self.segment.flush()
+            os.fsync(self.segment.fileno())
+        except OSError:
+            self.failed = True
+            raise
+        self.pending.clear()
+        if self.segment.tell() >= self.segment_bytes:
+            self._rotate()
+
+    def snapshot(self) -> Path:
+        """
+        Snapshot the portfolio and delete the segments and snapshots it replaces.
+
+        Returns:
+            Path: The snapshot file.
+        """
+        self.commit()
+        path = write_snapshot(self.directory, self.portfolio, self.seq)
+        self.snapshot_seq = self.seq
+        self._rotate()
+        current = self.directory / _segment_name(self.seq + 1)
+        for old in self.directory.glob('journal-*.log'):
+            if old != current and _seq_of(old) <= self.seq:
+                old.unlink()
+        for old in self.directory.glob('snapshot-*.snap'):
+            if old != path:
+                old.unlink()
+        return path
+
+    def close(self) -> None:
+        try:
+            if not self.failed:
+                self.commit()
+        finally:
+            self.segment.close()
+
+    def __enter__(self) -> "Journal":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+def main():
+
+    # Declare the argparser
+    parser = argparse.ArgumentParser(description="Recover a portfolio from its trade journal.")
+    parser.add_argument("directory",  type=Path, help="The journal directory")
+    parser.add_argument("--snapshot", action='store_true', help="Write a fresh snapshot after recovering")
+    parser.add_argument("--output",   type=Path, help="Write the recovered holdings to this CSV file")
+    args = parser.parse_args()
+
+    # Recover the portfolio
+    start = time.perf_counter()
+    with Journal(args.directory, snapshot_every=None) as journal:
+        elapsed = time.perf_counter() - start
+        if args.snapshot:
+            journal.snapshot()
+        portfolio = journal.portfolio
+
+    print(f'Recovered {len(portfolio.stocks)} holdings up to trade {journal.seq} in {elapsed:0.2f}s', file=sys.stderr)
+    if args.output:
+        with args.output.open('w') as out:
+            out.write('name,shares,price\n')
+            out.writelines(f'{s.name},{s.shares},{s.price}\n' for s in portfolio.stocks)
+
+# If you know you know ;)
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+# montecarlo.py
+
+import argparse
+import math
+import multiprocessing
+import time
+import sys
+from collections import namedtuple
+from typing import Optional, Sequence
+
+import numpy as np
+
+import porty.mortgage as mortgage
+import porty.tableformat as tableformat
+
+# A short-rate model: dr = a*(b - r)*dt + sigma*r**power*dW (power 0 is Vasicek, 0.5 is CIR)
+RateModel = namedtuple('RateModel', ['r0', 'a', 'b', 'sigma', 'power'])
+
+def vasicek(r0: float, a: float, b: float, sigma: float) -> RateModel:
+    return RateModel(r0, a, b, sigma, 0.0)
+
+def cir(r0: float, a: float, b: float, sigma: float) -> RateModel:
+    return RateModel(r0, a, b, sigma, 0.5)
+
+class Summary:
+    """
+    A streaming summary of a distribution: count, mean, variance, extremes and a histogram.
+
+    Summaries of separate batches merge into the summary of all of them, so
+    simulated values never need to be kept once they have been added.
+    """
+    def __init__(self, low: float, high: float, bins: int = 1000):
+        self.edges = np.linspace(low, high, bins + 1)
+        self.counts = np.zeros(bins + 2, dtype=np.int64)     # With underflow and overflow bins
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, values: np.ndarray) -> None:
+        """
+        Add a batch of values.
+        """
+        if values.size == 0:
+            return
+        other = Summary.__new__(Summary)
+        other.edges = self.edges
+        other.counts = np.bincount(np.searchsorted(self.edges, values, side='right'), minlength=self.counts.size)
+        other.count = values.size
+        other.mean = float(values.mean())
+        other.m2 = float(((values - other.mean) ** 2).sum())
+        other.min = float(values.min())
+        other.max = float(values.max())
+        self.merge(other)
+
+    def merge(self, other: "Summary") -> None:
+        """
+        Combine another summary (with the same bins) into this one.
+        """
+        if other.count == 0:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.counts += other.counts
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimate a quantile by interpolating within its histogram bin.
+        """
+        rank = q * self.count
+        cumulative = np.cumsum(self.counts)
+        i = int(np.searchsorted(cumulative, rank))
+        if i == 0:
+            return self.min
+        if i == self.counts.size - 1:
+            return self.max
+        before = cumulative[i-1]
+        frac = (rank - before) / self.counts[i] if self.counts[i] else 0.0
+        low, high = self.edges[i-1], self.edges[i]
+        return float(min(max(low + frac * (high - low), self.min), self.max))
+
+# The results of a simulation
+Results = namedtuple('Results', ['total_paid', 'months', 'unpaid'])
+
+def _new_results(principal: float, max_months: int) -> Results:
+    return Results(Summary(0.0, 5 * principal), Summary(0, max_months + 1, max_months + 1), 0)
+
+def simulate_paths(npaths: int, seed: np.random.SeedSequence, model: RateModel, principal: float,
+                   payment: float, windows: Sequence[mortgage.Window] = (), max_months: int = 600,
+                   batch: int = 100_000) -> Results:
+    """
+    Simulate adjustable-rate loans along random interest-rate paths.
+
+    Paths are generated and amortized in batches, month by month, and only the
+    summaries of the results are kept.
+
+    Args:
+        npaths (int): The number of rate paths.
+        seed (np.random.SeedSequence): The seed of this random stream.
+        model (RateModel): The short-rate model.
+        principal (float): The amount borrowed.
+        payment (float): The monthly payment.
+        windows (Sequence[Window]): Extra-payment windows.
+        max_months (int): Give up on loans that are not paid off by then.
+        batch (int): The number of paths simulated at once.
+
+    Returns:
+        Results: Summaries of the total paid and months to payoff, and the count of loans never paid off.
+    """
+    rng = np.random.default_rng(seed)
+    results = _new_results(principal, max_months)
+    unpaid = 0
+    dt = 1 / 12
+    for start in range(0, npaths, batch):
+        n = min(batch, npaths - start)
+        loans = mortgage.Scenarios(np.full(n, principal), model.r0, payment, windows)
+        rate = np.full(n, model.r0)
+        while loans.running and loans.month < max_months:
+            shock = rng.standard_normal(n)
+            level = np.maximum(rate, 0.0) ** model.power if model.power else 1.0
+            rate = rate + model.a * (model.b - rate) * dt + model.sigma * level * math.sqrt(dt) * shock
+            loans.step(np.maximum(rate[loans.index], 0.0) / 12)
+            index, paid = loans.finished()
+            results.total_paid.add(paid)
+            results.months.add(np.full(index.size, float(loans.month)))
+        unpaid += loans.running
+    return results._replace(unpaid=unpaid)
+
+def _run_shard(task: tuple) -> Results:
+    return simulate_paths(*task)
+
+def run(npaths: int, model: RateModel, principal: float, payment: float,
+        windows: Sequence[mortgage.Window] = (), max_months: int = 600, seed: int = 0,
+        shard_size: int = 250_000, workers: Optional[int] = None) -> Results:
+    """
+    Run a Monte Carlo simulation, sharded over a process pool.
+
+    Every shard gets an independent random stream spawned from the seed and the
+    shards are merged in order, so the results depend on the seed and shard
+    size but not on the number of workers.
+
+    Args:
+        npaths (int): The total number of rate paths.
+        model (RateModel): The short-rate model.
+        principal (float): The amount borrowed.
+        payment (float): The monthly payment.
+        windows (Sequence[Window]): Extra-payment windows.
+        max_months (int): Give up on loans that are not paid off by then.
+        seed (int): The root seed.
+        shard_size (int): The number of paths per shard.
+        workers (int, optional): The number of processes. Defaults to the CPU count.
+
+    Returns:
+        Results: The merged summaries of all the shards.
+    """
+    sizes = [min(shard_size, npaths - start) for start in range(0, npaths, shard_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(n, s, model, principal, payment, list(windows), max_months) for n, s in zip(sizes, seeds)]
+
+    results = _new_results(principal, max_months)
+    unpaid = 0
+    with multiprocessing.Pool(workers) as pool:
+        for shard in pool.imap(_run_shard, tasks):
+            results.total_paid.merge(shard.total_paid)
+            results.months.merge(shard.months)
+            unpaid += shard.unpaid
+    return results._replace(unpaid=unpaid)
+
+def print_results(results: Results, formatter: tableformat.TableFormatter) -> None:
+    """
+    Print the summaries as a table.
+    """
+    formatter.headings(['Metric', 'Count', 'Mean', 'Std', 'Min', 'P5', 'P50', 'P95', 'Max'])
+    for name, summary in (('Paid', results.total_paid), ('Months', results.months)):
+        values = [summary.mean, summary.std, summary.min, summary.quantile(0.05),
+                  summary.quantile(0.5), summary.quantile(0.95), summary.max]
+        formatter.row([name, str(summary.count)] + [f'{v:0.2f}' for v in values])
+
+def main():
+
+    # Declare the argparser
+    parser = argparse.ArgumentParser(description="Monte Carlo simulation of adjustable-rate mortgages.")
+    parser.add_argument("--paths",       type=int, default=1_000_000, help="Number of simulated rate paths")
+    parser.add_argument("--model",       type=str, choices=['vasicek', 'cir'], default='vasicek', help="Short-rate model")
+    parser.add_argument("--r0",          type=float, default=0.05, help="Initial yearly rate")
+    parser.add_argument("--a",           type=float, default=0.2, help="Speed of mean reversion")
+    parser.add_argument("--b",           type=float, default=0.05, help="Long-term mean rate")
+    parser.add_argument("--sigma",       type=float, default=0.01, help="Rate volatility")
+    parser.add_argument("--principal",   type=float, default=500000.0, help="Amount borrowed")
+    parser.add_argument("--payment",     type=float, default=2684.11, help="Monthly payment")
+    parser.add_argument("--extra",       type=float, default=1000.0, help="Extra monthly payment")
+    parser.add_argument("--extra-start", type=int, default=61, help="First month of extra payments")
+    parser.add_argument("--extra-end",   type=int, default=108, help="Last month of extra payments")
+    parser.add_argument("--max-months",  type=int, default=600, help="Give up on loans not paid off by then")
+    parser.add_argument("--seed",        type=int, default=0, help="Random seed")
+    parser.add_argument("--shard-size",  type=int, default=250_000, help="Paths per shard")
+    parser.add_argument("--workers",     type=int, help="Number of worker processes")
+    parser.add_argument("--fmt",         type=str, default='txt', help="The table format")
+    args = parser.parse_args()
+
+    # Run the simulation
+    model = (vasicek if args.model == 'vasicek' else cir)(args.r0, args.a, args.b, args.sigma)
+    windows = [mortgage.Window(args.extra, args.extra_start, args.extra_end)]
+    start = time.perf_counter()
+    results = run(args.paths, model, args.principal, args.payment, windows, args.max_months,
+                  args.seed, args.shard_size, args.workers)
+    elapsed = time.perf_counter() - start
+
+    print_results(results, tableformat.create_formatter(args.fmt))
+    print(f'{results.unpaid} loans not paid off in {args.max_months} months', file=sys.stderr)
+    print(f'{args.paths} paths in {elapsed:0.2f}s ({args.paths / elapsed:0.0f} paths/s)', file=sys.stderr)
+
+# If you know you know ;)
+if __name__ == '__main__':
+    main()
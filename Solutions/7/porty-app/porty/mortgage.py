@@ -0,0 +1,378 @@
+# mortgage.py
+
+import argparse
+import math
+from collections import namedtuple
+from typing import Iterator, Sequence, Tuple
+
+import numpy as np
+
+import porty.tableformat as tableformat
+
+# An extra-payment window: pay `extra` on top of the payment from month `start` to `end` (inclusive).
+# Each field may be a number or an array with one value per scenario.
+Window = namedtuple('Window', ['extra', 'start', 'end'])
+
+# The outcome of every scenario
+Payoff = namedtuple('Payoff', ['total_paid', 'months'])
+
+def simulate_loan(principal: float, rate: float, payment: float, windows: Sequence[Window] = (),
+                  max_months: int = 1200) -> Tuple[float, int]:
+    """
+    Simulate a single loan month by month, exactly like Solutions/1/mortgage.py.
+
+    This is the reference the vectorized engine is checked against.
+
+    Args:
+        principal (float): The amount borrowed.
+        rate (float): The yearly interest rate.
+        payment (float): The monthly payment.
+        windows (Sequence[Window]): Extra-payment windows.
+        max_months (int): Give up on loans that are not paid off by then.
+
+    Returns:
+        Tuple[float, int]: The total paid and the months to payoff (-1 if not paid off).
+    """
+    total_paid = 0.0
+    month = 0
+    while principal > 0:
+        if month == max_months:
+            return total_paid, -1
+        month = month + 1
+        principal = principal * (1+rate/12) - payment
+        total_paid = total_paid + payment
+
+        for extra, start, end in windows:
+            if month >= start and month <= end:
+                principal = principal - extra
+                total_paid = total_paid + extra
+    return total_paid, month
+
+class Scenarios:
+    """
+    The state of many loans advanced together, one month at a time.
+
+    Every argument is broadcast to a common shape and flattened, so a grid of
+    scenarios can be built by passing arrays with different broadcastable shapes.
+    """
+    def __init__(self, principal, rate, payment, windows: Sequence[Window] = ()):
+        arrays = np.broadcast_arrays(principal, rate, payment, *[f for w in windows for f in w])
+        self.shape = arrays[0].shape
+        flat = [np.array(a, dtype=float).ravel() for a in arrays]
+        self.balance = flat[0]
+        self.monthly_rate = flat[1] / 12
+        self.payment = flat[2]
+        if windows:
+            self.extra, self.start, self.end = (np.vstack(flat[3+i::3]) for i in range(3))
+        else:
+            self.extra = self.start = self.end = np.zeros((0, self.balance.size))
+        self.total_paid = np.zeros_like(self.balance)
+        self.month = 0
+
+        # Positions (in the flattened input) of the loans in the working arrays,
+        # and how many of those have finished but not been dropped yet
+        self.index = np.arange(self.balance.size)
+        self.frozen = 0
+
+    def step(self, monthly_rate: np.ndarray = None) -> None:
+        """
+        Advance every running loan by one month.
+
+        Args:
+            monthly_rate (np.ndarray, optional): This month's rate for each running loan.
+                Defaults to the fixed rate the scenarios were created with.
+        """
+        self.month += 1
+        if monthly_rate is None:
+            monthly_rate = self.monthly_rate
+        self.balance = self.balance * (1 + monthly_rate) - self.payment
+        self.total_paid = self.total_paid + self.payment
+        if self.extra.size:
+            in_window = (self.start <= self.month) & (self.month <= self.end)
+            extra = (self.extra * in_window).sum(axis=0)
+            self.balance -= extra
+            self.total_paid += extra
+
+    @property
+    def running(self) -> int:
+        '''
+        The number of loans that have not been paid off.
+        '''
+        return self.index.size - self.frozen
+
+    def finished(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Take out the loans that have just been paid off.
+
+        Finished loans are frozen in place (their balance becomes NaN and they stop
+        paying) and the working arrays are only compacted once a quarter of their
+        entries are frozen, so the cost of copying is spread over many months.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The flat indices and total paid of the loans that finished.
+        """
+        done = self.balance <= 0
+        result = self.index[done], self.total_paid[done]
+        if result[0].size:
+            self.balance[done] = np.nan
+            self.payment[done] = 0.0
+            self.monthly_rate[done] = 0.0
+            self.extra[:, done] = 0.0
+            self.frozen += result[0].size
+            if self.frozen * 4 > self.index.size:
+                keep = ~np.isnan(self.balance)
+                for name in ('balance', 'monthly_rate', 'payment', 'total_paid', 'index'):
+                    setattr(self, name, getattr(self, name)[keep])
+                self.extra, self.start, self.end = self.extra[:, keep], self.start[:, keep], self.end[:, keep]
+                self.frozen = 0
+        return result
+
+def simulate(principal, rate, payment, windows: Sequence[Window] = (), max_months: int = 1200) -> Payoff:
+    """
+    Simulate a grid of loans, advancing all of them per month as arrays.
+
+    Paid-off loans are masked out and periodically dropped from the working
+    arrays, so each month costs roughly as much as the number of loans still running.
+
+    Args:
+        principal: The amounts borrowed.
+        rate: The yearly interest rates.
+        payment: The monthly payments.
+        windows (Sequence[Window]): Extra-payment windows.
+        max_months (int): Give up on loans that are not paid off by then.
+
+    Returns:
+        Payoff: Arrays with the total paid and the months to payoff (-1 if not paid off).
+    """
+    loans = Scenarios(principal, rate, payment, windows)
+    total_paid = np.zeros(loans.balance.size)
+    months = np.full(loans.balance.size, -1)
+
+    # Loans with nothing to pay off finish at month 0
+    while True:
+        index, paid = loans.finished()
+        total_paid[index] = paid
+        months[index] = loans.month
+        if not loans.running or loans.month == max_months:
+            break
+        loans.step()
+
+    # Loans that never finished report what they paid so far
+    running = ~np.isnan(loans.balance)
+    total_paid[loans.index[running]] = loans.total_paid[running]
+    return Payoff(total_paid.reshape(loans.shape), months.reshape(loans.shape))
+
+def schedule(principal, rate, payment, windows: Sequence[Window] = (), max_months: int = 1200) -> Iterator[Tuple[int, np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Stream the amortization schedule of a grid of loans.
+
+    Nothing is kept between months, so the schedule of a large grid can be
+    written out without holding all of it in memory.
+
+    Args:
+        principal: The amounts borrowed.
+        rate: The yearly interest rates.
+        payment: The monthly payments.
+        windows (Sequence[Window]): Extra-payment windows.
+        max_months (int): Stop after this many months.
+
+    Returns:
+        Iterator: For each month, the month, the flat indices of the loans still
+        running at its start, their total paid and their remaining principal.
+    """
+    loans = Scenarios(principal, rate, payment, windows)
+    loans.finished()
+    while loans.running and loans.month < max_months:
+        running = ~np.isnan(loans.balance)
+        loans.step()
+        yield loans.month, loans.index[running], loans.total_paid[running], loans.balance[running]
+        loans.finished()
+
+class Amortization:
+    """
+    Closed-form amortization of a single loan.
+
+    The months are split into segments over which the extra payments are
+    constant, and the annuity formula
+
+        balance(n) = balance(0) * g**n - q * (g**n - 1) / r,   g = 1 + r
+
+    (r the monthly rate, q the payment plus the active extras) is applied
+    across each segment, so every query costs O(number of windows).
+    """
+    def __init__(self, principal: float, rate: float, payment: float, windows: Sequence[Window] = ()):
+        self.principal = principal
+        self.monthly_rate = rate / 12
+        self.payment = payment
+        self.windows = list(windows)
+
+        # Split the months at every window edge into (first month, last month, payment) segments
+        edges = sorted({1} | {int(w.start) for w in self.windows} | {int(w.end) + 1 for w in self.windows})
+        edges = [e for e in edges if e >= 1] + [math.inf]
+        self.segments = []
+        for first, nxt in zip(edges, edges[1:]):
+            q = payment + sum(w.extra for w in self.windows if w.start <= first <= w.end)
+            self.segments.append((first, nxt - 1, q))
+
+    def _advance(self, balance: float, q: float, n: int) -> float:
+        '''
+        The balance after n months starting from balance and paying q each month.
+        '''
+        r = self.monthly_rate
+        if r == 0:
+            return balance - q * n
+        g = (1 + r) ** n
+        return balance * g - q * (g - 1) / r
+
+    def _months_to_zero(self, balance: float, q: float) -> float:
+        '''
+        The first month n >= 1 at which the balance is no longer positive (inf if never).
+        '''
+        r = self.monthly_rate
+        if r == 0:
+            n = math.ceil(balance / q) if q > 0 else math.inf
+        elif q > r * balance:
+            n = math.ceil(math.log(q / (q - r * balance)) / math.log1p(r))
+        else:
+            return math.inf
+
+        # Correct for rounding in the logarithms
+        n = max(n, 1)
+        while n > 1 and self._advance(balance, q, n - 1) <= 0:
+            n -= 1
+        while self._advance(balance, q, n) > 0:
+            n += 1
+        return n
+
+    def balance_at(self, month: int) -> float:
+        """
+        The balance after the given month's payments, ignoring that the loan stops at payoff.
+
+        Args:
+            month (int): The month (0 is the amount borrowed).
+
+        Returns:
+            float: The remaining balance (negative once the loan is overpaid).
+        """
+        balance = self.principal
+        for first, last, q in self.segments:
+            if month < first:
+                break
+            balance = self._advance(balance, q, min(month, last) - first + 1)
+        return balance
+
+    def payoff(self, max_months: int = 1200) -> Tuple[float, int]:
+        """
+        The total paid and months to payoff, as simulate_loan() would compute them.
+
+        Args:
+            max_months (int): Give up on loans that are not paid off by then.
+
+        Returns:
+            Tuple[float, int]: The total paid and the months to payoff (-1 if not paid off).
+        """
+        balance = self.principal
+        total_paid = 0.0
+        if balance <= 0:
+            return total_paid, 0
+        for first, last, q in self.segments:
+            n = self._months_to_zero(balance, q)
+            if first + n - 1 <= min(last, max_months):
+                return total_paid + q * n, first + n - 1
+            if first > max_months:
+                break
+            length = min(last, max_months) - first + 1
+            balance = self._advance(balance, q, length)
+            total_paid += q * length
+        return total_paid, -1
+
+    def total_interest(self) -> float:
+        """
+        The interest paid over the life of the loan.
+
+        Returns:
+            float: The total paid minus the amount borrowed, less any overpayment in the last month.
+        """
+        total_paid, months = self.payoff()
+        if months < 0:
+            raise ValueError('The loan is never paid off')
+        return total_paid - self.principal + self.balance_at(months)
+
+def solve_payment(principal: float, rate: float, months: int, windows: Sequence[Window] = (),
+                  tol: float = 1e-9) -> float:
+    """
+    Find the smallest monthly payment that pays off a loan within the given number of months.
+
+    The balance after a fixed number of months is linear in the payment, so the
+    secant method finds the root of balance_at(months) in one or two steps.
+
+    Args:
+        principal (float): The amount borrowed.
+        rate (float): The yearly interest rate.
+        months (int): The month by which the loan must be paid off.
+        windows (Sequence[Window]): Extra-payment windows.
+        tol (float): Relative tolerance of the root.
+
+    Returns:
+        float: The monthly payment.
+    """
+    # Aim slightly below zero so that the rounding of a month-by-month
+    # simulation cannot leave a fraction of a cent for one more month
+    target = -1e-9 * principal
+    def balance(payment: float) -> float:
+        return Amortization(principal, rate, payment, windows).balance_at(months) - target
+
+    p0, p1 = 0.0, principal / months
+    f0, f1 = balance(p0), balance(p1)
+    while abs(p1 - p0) > tol * max(abs(p1), 1.0) and f1 != f0:
+        p0, p1, f0 = p1, p1 - f1 * (p1 - p0) / (f1 - f0), f1
+        f1 = balance(p1)
+
+    # Nudge the root up until the loan really is paid off on time
+    while balance(p1) > 0:
+        p1 = math.nextafter(p1, math.inf)
+    return max(p1, 0.0)
+
+def main():
+
+    # Declare the argparser
+    parser = argparse.ArgumentParser(description="Simulate a grid of mortgage scenarios.")
+    parser.add_argument("--principal",   type=float, nargs='+', default=[500000.0], help="Amounts borrowed")
+    parser.add_argument("--rate",        type=float, nargs='+', default=[0.05], help="Yearly interest rates")
+    parser.add_argument("--payment",     type=float, nargs='+', default=[2684.11], help="Monthly payments")
+    parser.add_argument("--extra",       type=float, nargs='+', default=[1000.0], help="Extra monthly payments")
+    parser.add_argument("--extra-start", type=int, default=61, help="First month of extra payments")
+    parser.add_argument("--extra-end",   type=int, default=108, help="Last month of extra payments")
+    parser.add_argument("--schedule",    action='store_true', help="Print the schedule of every month")
+    parser.add_argument("--solve",       type=int, metavar='MONTHS', help="Solve for the payment that pays off the loan in MONTHS")
+    parser.add_argument("--fmt",         type=str, default='txt', help="The table format")
+    args = parser.parse_args()
+
+    # Build the grid of every combination of the given values
+    principal, rate, payment, extra = np.meshgrid(args.principal, args.rate, args.payment, args.extra, indexing='ij')
+    windows = [Window(extra, args.extra_start, args.extra_end)]
+    formatter = tableformat.create_formatter(args.fmt)
+
+    if args.solve:
+        formatter.headings(['Principal', 'Rate', 'Extra', 'Payment'])
+        for p, r, e in zip(principal[:, :, 0].ravel(), rate[:, :, 0].ravel(), extra[:, :, 0].ravel()):
+            payment = solve_payment(p, r, args.solve, [Window(e, args.extra_start, args.extra_end)])
+            formatter.row([f'{p:0.2f}', f'{r:0.4f}', f'{e:0.2f}', f'{payment:0.2f}'])
+        return
+
+    if args.schedule:
+        formatter.headings(['Scenario', 'Month', 'Paid', 'Principal'])
+        for month, index, total_paid, balance in schedule(principal, rate, payment, windows):
+            for i, paid, left in zip(index, total_paid, balance):
+                formatter.row([str(i), str(month), f'{paid:0.2f}', f'{left:0.2f}'])
+
+    # Print the outcome of each scenario
+    result = simulate(principal, rate, payment, windows)
+    formatter.headings(['Principal', 'Rate', 'Payment', 'Extra', 'Paid', 'Months'])
+    for values in zip(principal.ravel(), rate.ravel(), payment.ravel(), extra.ravel(),
+                      result.total_paid.ravel(), result.months.ravel()):
+        formatter.row([f'{v:0.2f}' if isinstance(v, float) else str(v) for v in values])
+
+# If you know you know ;)
+if __name__ == '__main__':
+    main()
@@ -2,12 +2,99 @@
 
 import porty.report as report
 import argparse
+import csv
+import math
+import multiprocessing
+import os
 from pathlib import Path
+from typing import Iterable, List, Tuple
 
-def portfolio_cost(filename: Path) -> float:
+# Files at least this large are costed in parallel byte ranges
+PARALLEL_BYTES = 64 * 1024 * 1024
+
+# The size of the byte range handed to each task
+CHUNK_BYTES = 16 * 1024 * 1024
+
+def _lines_cost(lines: Iterable[str], shares: int, price: int) -> float:
+    '''
+    Sum shares * price over CSV lines, converting only those two columns.
+    '''
+    return math.fsum(int(row[shares]) * float(row[price]) for row in csv.reader(lines) if row)
+
+def _columns(header: str) -> Tuple[int, int]:
+    '''
+    Find the indices of the shares and price columns in a header line.
+    '''
+    headers = next(csv.reader([header]))
+    return headers.index('shares'), headers.index('price')
+
+def _chunk_cost(task: Tuple[Path, int, int, int, int]) -> float:
+    filename, start, end, shares, price = task
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return _lines_cost(data.decode().splitlines(), shares, price)
+
+def _chunks(filename: Path, start: int, size: int, chunk_bytes: int) -> List[Tuple[int, int]]:
+    '''
+    Split the bytes from start to the end of a file into ranges of whole lines.
+    '''
+    bounds = [start]
+    with open(filename, 'rb') as f:
+        while bounds[-1] < size:
+            f.seek(min(bounds[-1] + chunk_bytes, size))
+            f.readline()
+            bounds.append(min(f.tell(), size))
+    return list(zip(bounds, bounds[1:]))
+
+def portfolio_cost_parallel(filename: Path, workers: int = None, chunk_bytes: int = CHUNK_BYTES) -> float:
+    """
+    Compute the total cost of a portfolio CSV file, costing byte ranges of it in parallel.
+
+    Args:
+        filename (Path): Path to the (uncompressed) CSV file containing portfolio data.
+        workers (int, optional): Number of worker processes. Defaults to the CPU count.
+        chunk_bytes (int): The approximate size of each byte range.
+
+    Returns:
+        float: The total calculated cost.
+    """
+    with open(filename, 'rb') as f:
+        header = f.readline()
+    shares, price = _columns(header.decode())
+    chunks = _chunks(filename, len(header), os.path.getsize(filename), chunk_bytes)
+    tasks = [(filename, start, end, shares, price) for start, end in chunks]
+    with multiprocessing.Pool(workers) as pool:
+        return math.fsum(pool.imap_unordered(_chunk_cost, tasks))
+
+def portfolio_cost(filename: Path, workers: int = None) -> float:
     """
     Compute the total cost (shares * price) of a portfolio CSV file.
 
+    Only the shares and price columns are converted and no records are built.
+    Large files are split into byte ranges costed by a pool of processes.
+
+    Args:
+        filename (Path): Path to the CSV file containing portfolio data.
+        workers (int, optional): Number of worker processes for large files. Defaults to the CPU count.
+
+    Returns:
+        float: The total calculated cost.
+    """
+
+    # Cost large files in parallel
+    if workers != 1 and os.path.getsize(filename) >= PARALLEL_BYTES:
+        return portfolio_cost_parallel(filename, workers)
+
+    # Stream the file through the two columns
+    with open(filename) as lines:
+        shares, price = _columns(next(lines))
+        return _lines_cost(lines, shares, price)
+
+def portfolio_cost_records(filename: Path) -> float:
+    """
+    Compute the total cost of a portfolio CSV file from a list of Stock objects.
+
     Args:
         filename (Path): Path to the CSV file containing portfolio data.
 
@@ -25,11 +112,12 @@ def main():
 
     # Declare the argparser
     parser = argparse.ArgumentParser(description="Calculate the total cost of a portfolio file.")
-    parser.add_argument("filename", type=Path, help="Path to the input CSV file")
+    parser.add_argument("filename",  type=Path, help="Path to the input CSV file")
+    parser.add_argument("--workers", type=int, help="Number of worker processes for large files")
     args = parser.parse_args()
 
     # Calculate the cost
-    cost = portfolio_cost(args.filename)
+    cost = portfolio_cost(args.filename, args.workers)
     print("Total cost:", cost)
 
 # If you know you Know ;)
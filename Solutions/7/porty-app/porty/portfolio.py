@@ -1,29 +1,379 @@
 # portfolio.py
 
 from porty.stock import Stock
-from typing import List, Any
-from pydantic import BaseModel, Field
+from bisect import bisect_left, bisect_right
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import weakref
+from pydantic import BaseModel, Field, PrivateAttr, TypeAdapter
+import porty.aggregate as aggregate
 import porty.fileparse as fileparse
 
+# Validates a whole list of stocks in a single call
+_stock_list = TypeAdapter(List[Stock])
+
+def _stock_mappings(doc: Any) -> Iterator[Dict[str, Any]]:
+    '''
+    Find the stock mappings in a YAML document, flattening nested "stocks" lists.
+    '''
+    if isinstance(doc, list):
+        for item in doc:
+            yield from _stock_mappings(item)
+    elif isinstance(doc, dict) and 'stocks' in doc:
+        yield from _stock_mappings(doc['stocks'])
+    elif doc is not None:
+        yield doc
+
+class StockList(list):
+    '''
+    A list of stocks that tells its portfolio about every stock added or removed.
+    '''
+    def __init__(self, stocks: Iterable[Stock] = (), owner: "Portfolio" = None):
+        super().__init__(stocks)
+        # A weak reference, so the portfolio is freed as soon as it is no longer used
+        self._owner = weakref.ref(owner) if owner is not None else None
+
+    @property
+    def owner(self) -> Optional["Portfolio"]:
+        return self._owner() if self._owner is not None else None
+
+    def _added(self, stocks: Iterable[Stock]) -> None:
+        for stock in stocks:
+            self.owner._add(stock)
+
+    def _removed(self, stocks: Iterable[Stock]) -> None:
+        for stock in stocks:
+            self.owner._remove(stock)
+
+    def append(self, stock: Stock) -> None:
+        super().append(stock)
+        self._added([stock])
+
+    def extend(self, stocks: Iterable[Stock]) -> None:
+        stocks = list(stocks)
+        super().extend(stocks)
+        self._added(stocks)
+
+    def __iadd__(self, stocks: Iterable[Stock]) -> "StockList":
+        self.extend(stocks)
+        return self
+
+    def insert(self, index: int, stock: Stock) -> None:
+        super().insert(index, stock)
+        self._added([stock])
+
+    def remove(self, stock: Stock) -> None:
+        index = self.index(stock)
+        removed = self[index]
+        super().__delitem__(index)
+        self._removed([removed])
+
+    def pop(self, index: int = -1) -> Stock:
+        stock = super().pop(index)
+        self._removed([stock])
+        return stock
+
+    def clear(self) -> None:
+        removed = list(self)
+        super().clear()
+        self._removed(removed)
+
+    def __setitem__(self, index: Any, value: Any) -> None:
+        if isinstance(index, slice):
+            removed, added = self[index], list(value)
+        else:
+            removed, added = [self[index]], [value]
+        super().__setitem__(index, added if isinstance(index, slice) else value)
+        self._removed(removed)
+        self._added(added)
+
+    def __delitem__(self, index: Any) -> None:
+        removed = self[index] if isinstance(index, slice) else [self[index]]
+        super().__delitem__(index)
+        self._removed(removed)
+
+    def __imul__(self, n: int) -> "StockList":
+        removed = list(self)
+        super().__imul__(n)
+        self._removed(removed)
+        self._added(self)
+        return self
+
+    def __reduce__(self):
+        # Pickle as a plain list; the portfolio wraps it again when it is restored
+        return (list, (list(self),))
+
+class RunningSum:
+    '''
+    A float total updated by adding and subtracting terms.
+
+    Uses Neumaier's compensated summation, so a total that goes through many
+    updates stays as accurate as summing the current terms from scratch.
+    '''
+    def __init__(self) -> None:
+        self.total = 0.0
+        self.compensation = 0.0
+
+    def add(self, x: float) -> None:
+        t = self.total + x
+        if abs(self.total) >= abs(x):
+            self.compensation += (self.total - t) + x
+        else:
+            self.compensation += (x - t) + self.total
+        self.total = t
+
+    @property
+    def value(self) -> float:
+        return self.total + self.compensation
+
+# The keys of the sorted range indexes
+_RANGE_KEYS: Dict[str, Callable[[Stock], float]] = {
+    'price': lambda s: s.price,
+    'cost':  lambda s: s.cost,
+}
+
 class Portfolio(BaseModel):
     """
     Represents a portfolio containing a collection of stock holdings.
 
+    The portfolio keeps a hash index of the holdings by symbol, updated as stocks
+    are added, removed or renamed, and sorted price and cost indexes for range
+    queries. The sorted indexes are built on the first query and then kept
+    sorted as stocks are added, removed and changed.
+    The total cost and the shares held per symbol are running aggregates,
+    updated in O(1) on every change.
+
     Attributes:
         stocks (List[Stock]): A list of Stock objects held within the portfolio.
     """
 
     stocks: List[Stock] = Field(description="A list of stock holdings")
 
+    _by_symbol: Dict[str, List[Stock]] = PrivateAttr(default_factory=dict)
+    _ranges: Dict[str, Tuple[List[float], List[Stock]]] = PrivateAttr(default_factory=dict)
+    _total_cost: RunningSum = PrivateAttr(default_factory=RunningSum)
+    _shares: Dict[str, int] = PrivateAttr(default_factory=dict)
+
+    def model_post_init(self, context: Any) -> None:
+        self._attach(self.stocks)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if name == 'stocks':
+            self._detach()
+            super().__setattr__(name, value)
+            self._attach(self.stocks)
+        else:
+            super().__setattr__(name, value)
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        super().__setstate__(state)
+        self._attach(self.stocks)
+
+    def __copy__(self) -> "Portfolio":
+        other = super().__copy__()
+        other._attach(other.stocks)
+        return other
+
+    def __deepcopy__(self, memo: Optional[Dict[int, Any]] = None) -> "Portfolio":
+        other = super().__deepcopy__(memo)
+        other._attach(other.stocks)
+        return other
+
+    def __eq__(self, other: Any) -> bool:
+        # Compare the holdings only, not the indexes and totals derived from them
+        if not isinstance(other, Portfolio):
+            return NotImplemented
+        return self.stocks == other.stocks
+
+    def _attach(self, stocks: List[Stock]) -> None:
+        '''
+        Wrap the stock list so its changes are seen, and index every stock.
+        '''
+        self.__dict__['stocks'] = StockList(stocks, self)
+        self._by_symbol = {}
+        self._ranges = {}
+        self._total_cost = RunningSum()
+        self._shares = {}
+        for stock in stocks:
+            self._add(stock)
+
+    def _detach(self) -> None:
+        for stock in self.stocks:
+            stock._observers.remove(self)
+
+    def _add(self, stock: Stock) -> None:
+        stock._observers.append(self)
+        self._by_symbol.setdefault(stock.name, []).append(stock)
+        for key in self._ranges:
+            self._range_insert(key, stock)
+        self._total_cost.add(stock.cost)
+        self._add_shares(stock.name, stock.shares)
+
+    def _remove(self, stock: Stock) -> None:
+        stock._observers.remove(self)
+        self._unindex_symbol(stock, stock.name)
+        self._range_delete('price', stock, stock.price)
+        self._range_delete('cost', stock, stock.cost)
+        self._total_cost.add(-stock.cost)
+        self._add_shares(stock.name, -stock.shares)
+
+    def _add_shares(self, name: str, shares: int) -> None:
+        total = self._shares.get(name, 0) + shares
+        if name in self._by_symbol:
+            self._shares[name] = total
+        else:
+            self._shares.pop(name, None)
+
+    def _unindex_symbol(self, stock: Stock, name: str) -> None:
+        bucket = self._by_symbol[name]
+        del bucket[next(i for i, s in enumerate(bucket) if s is stock)]
+        if not bucket:
+            del self._by_symbol[name]
+
+    def _range_insert(self, key: str, stock: Stock) -> None:
+        '''
+        Insert a stock into a built range index, keeping it sorted.
+        '''
+        keys, stocks = self._ranges[key]
+        value = _RANGE_KEYS[key](stock)
+        i = bisect_right(keys, value)
+        keys.insert(i, value)
+        stocks.insert(i, stock)
+
+    def _range_delete(self, key: str, stock: Stock, value: float) -> None:
+        '''
+        Remove a stock, indexed under value, from a range index (if built).
+        '''
+        index = self._ranges.get(key)
+        if index is None:
+            return
+        keys, stocks = index
+        i = bisect_left(keys, value)
+        while i < len(keys) and keys[i] == value:
+            if stocks[i] is stock:
+                del keys[i], stocks[i]
+                return
+            i += 1
+        # Not found (a NaN key): build the index again on the next query
+        del self._ranges[key]
+
+    def _range_update(self, key: str, stock: Stock, old: float) -> None:
+        if key in self._ranges:
+            self._range_delete(key, stock, old)
+        if key in self._ranges:
+            self._range_insert(key, stock)
+
+    def stock_changed(self, stock: Stock, field: str, old: Any) -> None:
+        """
+        Keep the indexes up to date when a held stock is changed (called by Stock).
+        """
+        if field == 'name':
+            self._unindex_symbol(stock, old)
+            self._add_shares(old, -stock.shares)
+            self._by_symbol.setdefault(stock.name, []).append(stock)
+            self._add_shares(stock.name, stock.shares)
+        elif field == 'shares':
+            self._range_update('cost', stock, old * stock.price)
+            self._total_cost.add(stock.cost - old * stock.price)
+            self._add_shares(stock.name, stock.shares - old)
+        elif field == 'price':
+            self._range_update('price', stock, old)
+            self._range_update('cost', stock, stock.shares * old)
+            self._total_cost.add(stock.cost - stock.shares * old)
+
+    def __contains__(self, symbol: str) -> bool:
+        """
+        Check whether the portfolio holds a symbol.
+        """
+        return symbol in self._by_symbol
+
+    def __getitem__(self, symbol: str) -> List[Stock]:
+        """
+        Get the holdings of a symbol.
+
+        Raises:
+            KeyError: If the symbol is not held.
+        """
+        return list(self._by_symbol[symbol])
+
+    def _range_index(self, key: str) -> Tuple[List[float], List[Stock]]:
+        '''
+        Get (building it if needed) the stocks sorted by a key, with their key values.
+        '''
+        index = self._ranges.get(key)
+        if index is None:
+            keyfunc = _RANGE_KEYS[key]
+            pairs = sorted(((keyfunc(s), i) for i, s in enumerate(self.stocks)))
+            index = ([k for k, _ in pairs], [self.stocks[i] for _, i in pairs])
+            self._ranges[key] = index
+        return index
+
+    def where(self, name: Optional[str] = None, price_between: Optional[Tuple[float, float]] = None,
+              cost_between: Optional[Tuple[float, float]] = None) -> List[Stock]:
+        """
+        Select the holdings matching every given condition.
+
+        Args:
+            name (str, optional): Only holdings of this symbol.
+            price_between (Tuple[float, float], optional): Only holdings with low <= price <= high.
+            cost_between (Tuple[float, float], optional): Only holdings with low <= cost <= high.
+
+        Returns:
+            List[Stock]: The matching holdings.
+        """
+        candidates = None
+        if name is not None:
+            candidates = self._by_symbol.get(name, [])
+        for key, bounds in (('price', price_between), ('cost', cost_between)):
+            if bounds is None:
+                continue
+            keys, stocks = self._range_index(key)
+            found = stocks[bisect_left(keys, bounds[0]):bisect_right(keys, bounds[1])]
+            if candidates is None:
+                candidates = found
+            else:
+                ids = {id(s) for s in found}
+                candidates = [s for s in candidates if id(s) in ids]
+        return list(self.stocks) if candidates is None else list(candidates)
+
     @property
     def total_cost(self) -> float:
         """
-        Calculates the total cost of all stocks within the portfolio.
+        The total cost of all stocks within the portfolio.
+
+        The total is maintained as stocks are added, removed and changed, so
+        reading it does not touch the individual stocks.
 
         Returns:
             float: The sum of the costs of each stock.
         """
-        return sum(s.cost for s in self.stocks)
+        return self._total_cost.value
+
+    def shares(self, symbol: str) -> int:
+        """
+        The total number of shares held of a symbol, over all its holdings.
+
+        Args:
+            symbol (str): The stock symbol.
+
+        Returns:
+            int: The number of shares (0 if the symbol is not held).
+        """
+        return self._shares.get(symbol, 0)
+
+    def group_by(self, key: str = 'name', fields: Tuple[str, ...] = ('shares', 'cost'),
+                 ops: Tuple[str, ...] = aggregate.AGGREGATES) -> List[tuple]:
+        """
+        Aggregate the holdings per key (by default, consolidate the lots of each symbol).
+
+        Args:
+            key (str): The Stock attribute to group by.
+            fields (Tuple[str, ...]): The numeric Stock attributes to aggregate.
+            ops (Tuple[str, ...]): The aggregates to compute (any of aggregate.AGGREGATES).
+
+        Returns:
+            List[tuple]: One Group namedtuple per key.
+        """
+        return aggregate.group_by(self.stocks, key, fields, ops)
 
     @classmethod
     def from_csv(cls, lines: Any) -> "Portfolio":
@@ -38,3 +388,19 @@ class Portfolio(BaseModel):
         """
         stocks = fileparse.parse_csv(lines)
         return cls(stocks=stocks)
+
+    @classmethod
+    def from_yaml(cls, lines: Any) -> "Portfolio":
+        """
+        Creates a Portfolio instance from a (possibly multi-document) YAML stream.
+
+        All the stocks found in the stream are validated together in one bulk call.
+
+        Args:
+            lines (Any): A file-like object or string containing YAML formatted data.
+
+        Returns:
+            Portfolio: An instance of Portfolio populated with Stock objects.
+        """
+        mappings = [m for doc in fileparse.parse_yaml_all(lines) for m in _stock_mappings(doc)]
+        return cls(stocks=_stock_list.validate_python(mappings))
@@ -1,22 +1,37 @@
 # report.py
 
 import argparse
+import heapq
 import porty.fileparse as fileparse
 import porty.tableformat as tableformat
 from porty.stock import Stock
 from pathlib import Path
 from collections import namedtuple
-from typing import List, Dict
+from operator import attrgetter
+from typing import Any, Callable, Dict, List
 
 # Define a namedtuple to represent a stock record
 TableRow = namedtuple('TableRow', ['name', 'shares', 'price', 'change'])
 
-def read_portfolio(filename: Path) -> List[Stock]:
+# The keys report rows can be ordered by. The value is at the current price,
+# the cost at the purchase price (the current price less the change).
+SORT_KEYS: Dict[str, Callable[[TableRow], Any]] = {
+    'name':   attrgetter('name'),
+    'shares': attrgetter('shares'),
+    'price':  attrgetter('price'),
+    'change': attrgetter('change'),
+    'value':  lambda row: row.shares * row.price,
+    'cost':   lambda row: row.shares * (row.price - row.change),
+}
+
+def read_portfolio(filename: Path, where: Dict[str, Any] = None) -> List[Stock]:
     """
     Read a stock portfolio CSV file into a list of Stock.
 
     Args:
         filename (Path): Path to the CSV file with portfolio data.
+        where (Dict[str, Any], optional): Row filters on the raw columns, as for fileparse.parse_csv
+            (e.g. {'name': {'IBM'}}). Filtered rows never become Stock objects.
     
     Returns:
         Dict[Stock]: A list of Stock objects with the keys name, shares, and price.
@@ -24,17 +39,19 @@ def read_portfolio(filename: Path) -> List[Stock]:
     
     # Read the csv file
     with open(filename) as lines:
-        portdicts = fileparse.parse_csv(lines)
+        portdicts = fileparse.parse_csv(lines, where=where)
 
     # Create a stock for each entry in the svc file
     return [Stock(**d) for d in portdicts]
 
-def read_prices(filename: Path) -> Dict[str, float]:
+def read_prices(filename: Path, where: Dict[int, Any] = None) -> Dict[str, float]:
     """
     Read a CSV file of price data into a dictionary mapping names to prices.
 
     Args:
         filename (Path): Path to the CSV file with price data.
+        where (Dict[int, Any], optional): Row filters on the raw columns, as for fileparse.parse_csv.
+            The file has no headers, so columns are given by index (0 is the name).
 
     Returns:
         Dict[str, float]: A dictionary of stock names to their current prices.
@@ -42,7 +59,7 @@ def read_prices(filename: Path) -> Dict[str, float]:
 
     # Read the csv file to a dict
     with filename.open() as lines:
-        return dict(fileparse.parse_csv(lines, types=[str,float], has_headers=False))
+        return dict(fileparse.parse_csv(lines, types=[str,float], has_headers=False, where=where))
 
 def make_report(portfolio :List[Stock], prices: Dict[str, float]) -> List[TableRow]:
     '''
@@ -65,6 +82,73 @@ def make_report(portfolio :List[Stock], prices: Dict[str, float]) -> List[TableR
     # Return the report
     return report 
 
+def sort_key(name: str) -> Callable[[TableRow], Any]:
+    '''
+    Look up a sort key by name, raising a ValueError that lists the valid keys.
+    '''
+    try:
+        return SORT_KEYS[name]
+    except KeyError:
+        raise ValueError(f"Unknown sort key {name!r}, expected one of {', '.join(sorted(SORT_KEYS))}") from None
+
+def _sort_keys(text: str) -> List[str]:
+    '''
+    Parse the --sort argument, a comma-separated list of sort keys.
+    '''
+    keys = text.split(',')
+    try:
+        for key in keys:
+            sort_key(key.lstrip('-'))
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return keys
+
+def top_rows(report_data: List[TableRow], k: int, by: str = 'change', largest: bool = True) -> List[TableRow]:
+    """
+    Select the k rows with the largest (or smallest) value of a key.
+
+    Uses heap selection, which costs O(n log k) instead of sorting every row.
+
+    Args:
+        report_data (List[TableRow]): The report rows.
+        k (int): The number of rows to select.
+        by (str): The key to rank by (one of SORT_KEYS).
+        largest (bool): Select the largest values if True, the smallest otherwise.
+
+    Returns:
+        List[TableRow]: The selected rows, best first.
+
+    Raises:
+        ValueError: If the key is not one of SORT_KEYS.
+    """
+    select = heapq.nlargest if largest else heapq.nsmallest
+    return select(k, report_data, key=sort_key(by))
+
+def sort_rows(report_data: List[TableRow], keys: List[str]) -> List[TableRow]:
+    """
+    Sort report rows by several keys, each ascending or (prefixed with '-') descending.
+
+    Every key is computed once per row into a key array, then a list of row
+    positions is sorted by each array in turn, least significant key first,
+    relying on the sort being stable.
+
+    Args:
+        report_data (List[TableRow]): The report rows.
+        keys (List[str]): The keys to sort by, most significant first (e.g. ['-change', 'name']).
+
+    Returns:
+        List[TableRow]: The sorted rows.
+
+    Raises:
+        ValueError: If a key is not one of SORT_KEYS.
+    """
+    order = list(range(len(report_data)))
+    for key in reversed(keys):
+        descending = key.startswith('-')
+        values = list(map(sort_key(key.lstrip('-')), report_data))
+        order.sort(key=values.__getitem__, reverse=descending)
+    return [report_data[i] for i in order]
+
 def print_report(report_data: List[TableRow]) -> None:
     """
     Print a formatted table from a list of TableRow namedtuples.
@@ -94,11 +178,11 @@ def print_report(report_data: List[TableRow], formatter: tableformat.TableFormat
     formatter.headings(['Name','Shares','Price','Change'])
 
     # Format the rows
-    for name, shares, price, change in report_data:
-        rowdata = [name, str(shares), f'{price:0.2f}', f'{change:0.2f}']
-        formatter.row(rowdata)
+    formatter.rows(report_data, ['s', 'd', '.2f', '.2f'])
 
-def portfolio_report(portfolio_file: Path, price_file: Path, fmt: str) -> None:
+def portfolio_report(portfolio_file: Path, price_file: Path, fmt: str, workers: int = 1,
+                     top: int = None, bottom: int = None, by: str = 'change', sort: List[str] = None,
+                     symbols: List[str] = None) -> None:
     """
     Generate and print a stock performance report from portfolio and price files.
 
@@ -106,17 +190,34 @@ def portfolio_report(portfolio_file: Path, price_file: Path, fmt: str) -> None:
         portfolio_file (Path): Path to the CSV file containing portfolio data.
         price_file (Path): Path to the CSV file containing current stock prices.
         fmt (str): The table format.
+        workers (int): Number of processes rendering the report rows.
+        top (int, optional): Only show the rows with the largest values of `by`.
+        bottom (int, optional): Only show the rows with the smallest values of `by`, among the rows not in the top rows (shown after them).
+        by (str): The key used by top and bottom.
+        sort (List[str], optional): Keys to sort the rows by (e.g. ['-change', 'name']).
+        symbols (List[str], optional): Only report on these stock symbols.
     """
 
-    # Read data files 
-    portfolio = read_portfolio(portfolio_file)
-    prices = read_prices(price_file)
+    # Read data files, skipping the prices of stocks that are not held
+    portfolio = read_portfolio(portfolio_file, {'name': set(symbols)} if symbols else None)
+    prices = read_prices(price_file, {0: {s.name for s in portfolio}})
 
     # Create the report data
     report = make_report(portfolio, prices)
 
+    # Select and order the rows
+    if top is not None or bottom is not None:
+        selected = top_rows(report, top, by) if top else []
+        if bottom:
+            # Take the bottom rows from the rest, so no row is shown twice when they overlap
+            shown = {id(row) for row in selected}
+            selected += top_rows([row for row in report if id(row) not in shown], bottom, by, largest=False)
+        report = selected
+    if sort:
+        report = sort_rows(report, sort)
+
     # Print it out
-    formatter = tableformat.create_formatter(fmt)
+    formatter = tableformat.create_formatter(fmt, workers=workers)
     print_report(report, formatter)
 
 def main():
@@ -126,10 +227,17 @@ def main():
     parser.add_argument("portfolio", type=Path, help="Path to the input portfolio file")
     parser.add_argument("prices",    type=Path, help="Path to the input prices file")
     parser.add_argument("fmt",       type=str, help="The table format", default='txt')
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes rendering the report")
+    parser.add_argument("--top",     type=int, help="Only show the N rows with the largest --by values")
+    parser.add_argument("--bottom",  type=int, help="Only show the N rows with the smallest --by values")
+    parser.add_argument("--by",      type=str, default='change', choices=sorted(SORT_KEYS), help="The key used by --top and --bottom")
+    parser.add_argument("--sort",    type=_sort_keys, help="Comma-separated sort keys, '-' for descending (e.g. --sort=-change,name)")
+    parser.add_argument("--symbols", type=str, help="Comma-separated symbols to report on (default: all)")
     args = parser.parse_args()
 
     # Create the report
-    portfolio_report(args.portfolio, args.prices, args.fmt)
+    symbols = args.symbols.split(',') if args.symbols else None
+    portfolio_report(args.portfolio, args.prices, args.fmt, args.workers, args.top, args.bottom, args.by, args.sort, symbols)
     
 # If you know you know ;)
 if __name__ == '__main__':
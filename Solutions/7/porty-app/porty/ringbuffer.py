@@ -0,0 +1,245 @@
+# ringbuffer.py
+
+import argparse
+import struct
+import sys
+import time
+from collections import namedtuple
+from multiprocessing import shared_memory
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import porty.batch as batch
+import porty.tableformat as tableformat
+import porty.ticklog as ticklog
+
+# A tick as carried by the ring: the day (since 1970-01-01) and minute of the
+# tick and the (time.time()) time it was published, for latency measurements
+Tick = namedtuple('Tick', ['seq', 'name', 'price', 'day', 'minute', 'change', 'open', 'high', 'low', 'volume', 'published'])
+
+# Ring header: capacity, sequence number of the last published tick, closed flag
+_HEADER = struct.Struct('<QQQ')
+_HEAD_OFFSET = 8
+_CLOSED_OFFSET = 16
+_SLOTS_OFFSET = 64
+
+# A slot: the sequence number of the tick it holds, then the tick itself
+_SEQ = struct.Struct('<Q')
+_SLOT = struct.Struct('<Q16sdidddddqd')
+SLOT_SIZE = _SLOT.size
+NAME_SIZE = 16
+
+def backoff(idle: int) -> None:
+    '''
+    Wait after `idle` fruitless polls: spin at first, then yield the CPU, then sleep.
+    '''
+    if idle > 1000:
+        time.sleep(0.0005)
+    elif idle > 10:
+        time.sleep(0)
+
+class TickRing:
+    """
+    A single-producer, multi-consumer ring buffer of ticks in shared memory.
+
+    The producer writes fixed-size binary ticks into the slots in turn and
+    then publishes the sequence number of the last one. Consumers in any
+    process attach to the ring by name and read at their own pace. A
+    consumer that falls more than a ring's worth behind loses the oldest
+    ticks, which it detects from the sequence numbers.
+
+    Consumers copy runs of slots at once and then read the head again: the
+    ticks the producer may have started overwriting during the copy are
+    discarded and counted as dropped, so no torn tick is ever returned.
+    """
+    def __init__(self, shm: shared_memory.SharedMemory):
+        self.shm = shm
+        self.buf = shm.buf
+        self.capacity = _HEADER.unpack_from(self.buf, 0)[0]
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @classmethod
+    def create(cls, capacity: int = 65536, name: Optional[str] = None) -> "TickRing":
+        """
+        Create a new ring. The creator must call unlink() when done with it.
+
+        Args:
+            capacity (int): The number of ticks the ring holds.
+            name (str, optional): The name of the shared memory block.
+        """
+        shm = shared_memory.SharedMemory(name=name, create=True, size=_SLOTS_OFFSET + capacity * SLOT_SIZE)
+        _HEADER.pack_into(shm.buf, 0, capacity, 0, 0)
+        return cls(shm)
+
+    @classmethod
+    def attach(cls, name: str) -> "TickRing":
+        """
+        Attach to a ring created by another process.
+        """
+        return cls(batch.attach_shared_memory(name))
+
+    @property
+    def head(self) -> int:
+        '''
+        The sequence number of the last published tick (0 before the first).
+        '''
+        return _SEQ.unpack_from(self.buf, _HEAD_OFFSET)[0]
+
+    @property
+    def closed(self) -> bool:
+        return _SEQ.unpack_from(self.buf, _CLOSED_OFFSET)[0] != 0
+
+    def close(self) -> None:
+        self.buf.release()
+        self.shm.close()
+
+    def unlink(self) -> None:
+        self.shm.unlink()
+
+class TickWriter:
+    """
+    The producer of a ring.
+
+    Its update() method takes stocksim.py records, so it can be registered as
+    an observer of a MarketSimulator.
+    """
+    def __init__(self, ring: TickRing):
+        self.ring = ring
+        self.seq = ring.head
+
+    def publish(self, name: str, price: float, day: int, minute: float, change: float = 0.0,
+                open: float = 0.0, high: float = 0.0, low: float = 0.0, volume: int = 0) -> int:
+        """
+        Write a tick into the next slot and publish it.
+
+        Returns:
+            int: The sequence number of the tick.
+
+        Raises:
+            ValueError: If the encoded name is longer than NAME_SIZE bytes.
+        """
+        encoded = name.encode()
+        if len(encoded) > NAME_SIZE:
+            raise ValueError(f'Name {name!r} is longer than {NAME_SIZE} bytes')
+        buf = self.ring.buf
+        seq = self.seq + 1
+        _SLOT.pack_into(buf, _SLOTS_OFFSET + (seq % self.ring.capacity) * SLOT_SIZE, seq, encoded,
+                        price, day, minute, change, open, high, low, volume, time.time())
+        _SEQ.pack_into(buf, _HEAD_OFFSET, seq)
+        self.seq = seq
+        return seq
+
+    def update(self, record: Sequence) -> None:
+        '''
+        Publish a stocksim.py record (name, price, date, time, change, open, high, low, volume).
+        '''
+        name, price, date, tm, change, open, high, low, volume = record
+        t = ticklog.tick_time(date, tm)
+        day, minute = divmod(t, 24 * 60)
+        self.publish(name, price, int(day), minute, change, open, high, low, volume)
+
+    def close(self) -> None:
+        '''
+        Tell the consumers that no more ticks will be published.
+        '''
+        _SEQ.pack_into(self.ring.buf, _CLOSED_OFFSET, 1)
+
+class TickReader:
+    """
+    A consumer of a ring.
+
+    Args:
+        ring (TickRing): The ring to read.
+        oldest (bool): Start with the oldest tick still in the ring instead of the next one published.
+    """
+    def __init__(self, ring: TickRing, oldest: bool = False):
+        self.ring = ring
+        head = ring.head
+        self.next = max(1, head - ring.capacity + 2) if oldest else head + 1
+        self.dropped = 0
+        self.names: Dict[bytes, str] = {}
+
+    def poll(self, max_ticks: int = 1024) -> List[Tick]:
+        """
+        Read the ticks published since the last call, without waiting.
+
+        Ticks overwritten before they could be read are counted in `dropped`.
+
+        Args:
+            max_ticks (int): The most ticks to return.
+
+        Returns:
+            List[Tick]: The ticks, in order.
+        """
+        ring, buf, capacity, names = self.ring, self.ring.buf, self.ring.capacity, self.names
+        ticks: List[Tick] = []
+        while len(ticks) < max_ticks:
+            head = ring.head
+            if self.next > head:
+                break
+
+            # Copy the unread slots, up to the end of the ring, in one go. The
+            # slot after the head may be being rewritten already, so skip it.
+            first = max(self.next, head - capacity + 2)
+            self.dropped += first - self.next
+            last = min(head, first + max_ticks - len(ticks) - 1, first - first % capacity + capacity - 1)
+            offset = _SLOTS_OFFSET + (first % capacity) * SLOT_SIZE
+            data = bytes(buf[offset:offset + (last - first + 1) * SLOT_SIZE])
+
+            # Discard the ticks overwritten while they were copied
+            safe = min(max(first, ring.head - capacity + 2), last + 1)
+            self.dropped += safe - first
+            self.next = last + 1
+            for seq, name, price, day, minute, change, open, high, low, volume, published in \
+                    _SLOT.iter_unpack(data[(safe - first) * SLOT_SIZE:]):
+                decoded = names.get(name)
+                if decoded is None:
+                    decoded = names[name] = name.rstrip(b'\0').decode()
+                ticks.append(Tick(seq, decoded, price, day, minute, change, open, high, low, volume, published))
+        return ticks
+
+    def __iter__(self) -> Iterator[Tick]:
+        '''
+        Read ticks as they are published until the producer closes the ring.
+        '''
+        idle = 0
+        while True:
+            ticks = self.poll()
+            if ticks:
+                idle = 0
+                yield from ticks
+            elif self.ring.closed and self.next > self.ring.head:
+                return
+            else:
+                idle += 1
+                backoff(idle)
+
+def main():
+
+    # Declare the argparser
+    parser = argparse.ArgumentParser(description="Print the ticks published to a shared memory ring.")
+    parser.add_argument("ring",     type=str, help="The name of the ring's shared memory block")
+    parser.add_argument("--oldest", action='store_true', help="Start with the oldest tick still in the ring")
+    parser.add_argument("--fmt",    type=str, default='txt', help="The table format")
+    args = parser.parse_args()
+
+    # Follow the ring until the producer closes it
+    ring = TickRing.attach(args.ring)
+    reader = TickReader(ring, args.oldest)
+    formatter = tableformat.create_formatter(args.fmt)
+    formatter.headings(['Seq', 'Name', 'Price', 'Change', 'Volume', 'Latency(ms)'])
+    try:
+        for tick in reader:
+            latency = (time.time() - tick.published) * 1000
+            formatter.row([str(tick.seq), tick.name, f'{tick.price:0.2f}', f'{tick.change:0.2f}', str(tick.volume), f'{latency:0.3f}'])
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f'{reader.dropped} ticks dropped', file=sys.stderr)
+        ring.close()
+
+# If you know you know ;)
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+# server.py
+
+import argparse
+import io
+import json
+import os
+import socketserver
+import sys
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+import porty.report as report
+import porty.tableformat as tableformat
+from porty.client import DEFAULT_SOCKET
+
+class FileCache:
+    """
+    Keeps the parsed contents of files resident, reloading a file when it changes.
+
+    A file counts as changed when its modification time or size differs from
+    the last load, so every lookup costs a single stat() call.
+    """
+    def __init__(self, loader: Callable[[Path], Any]):
+        self.loader = loader
+        self.entries: Dict[Path, Tuple[tuple, Any]] = {}
+        self.lock = threading.Lock()
+
+    def get(self, filename: Path) -> Tuple[tuple, Any]:
+        """
+        Get the parsed contents of a file.
+
+        Args:
+            filename (Path): The file to look up.
+
+        Returns:
+            Tuple[tuple, Any]: The version of the file and its parsed contents.
+        """
+        st = filename.stat()
+        version = (st.st_mtime_ns, st.st_size)
+        entry = self.entries.get(filename)
+        if entry is None or entry[0] != version:
+            with self.lock:
+                entry = self.entries.get(filename)
+                if entry is None or entry[0] != version:
+                    entry = (version, self.loader(filename))
+                    self.entries[filename] = entry
+        return entry
+
+    def refresh(self) -> None:
+        """
+        Reload every cached file that has changed (or drop it if it was removed).
+        """
+        for filename in list(self.entries):
+            try:
+                self.get(filename)
+            except FileNotFoundError:
+                self.entries.pop(filename, None)
+
+class ReportService:
+    """
+    Produces reports from resident portfolios and price tables.
+
+    Rendered reports are cached as well and are reused for as long as neither
+    of the files they were made from has changed. Only the `max_rendered` most
+    recently used reports are kept.
+    """
+    def __init__(self, portfolios: Dict[str, Path] = None, prices: Path = None, max_rendered: int = 256):
+        self.portfolios = portfolios or {}
+        self.prices = prices
+        self.portfolio_cache = FileCache(report.read_portfolio)
+        self.price_cache = FileCache(report.read_prices)
+        self.max_rendered = max_rendered
+        self.rendered: OrderedDict[tuple, str] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def resolve(self, name: str) -> Path:
+        '''
+        Map a registered portfolio id to its file, treating anything else as a path.
+        '''
+        return Path(self.portfolios.get(name, name)).resolve()
+
+    def report(self, portfolio: str, prices: str = None, fmt: str = 'txt') -> str:
+        """
+        Produce a formatted report.
+
+        Args:
+            portfolio (str): A registered portfolio id or the path of a portfolio file.
+            prices (str, optional): The path of a prices file. Defaults to the server prices.
+            fmt (str): The table format.
+
+        Returns:
+            str: The formatted report.
+        """
+        if prices is None and self.prices is None:
+            raise ValueError('No prices file given')
+        portfolio_file = self.resolve(portfolio)
+        price_file = Path(prices or self.prices).resolve()
+        portfolio_version, stocks = self.portfolio_cache.get(portfolio_file)
+        price_version, price_table = self.price_cache.get(price_file)
+
+        # Reuse a rendered report made from the same versions of the files
+        key = (portfolio_file, portfolio_version, price_file, price_version, fmt)
+        with self.lock:
+            text = self.rendered.get(key)
+            if text is not None:
+                self.rendered.move_to_end(key)
+                return text
+        out = io.StringIO()
+        report.print_report(report.make_report(stocks, price_table), tableformat.create_formatter(fmt, out))
+        text = out.getvalue()
+        with self.lock:
+            self.rendered[key] = text
+            while len(self.rendered) > self.max_rendered:
+                self.rendered.popitem(last=False)
+        return text
+
+    def refresh(self) -> None:
+        """
+        Reload changed files and drop the rendered reports that are out of date.
+        """
+        self.portfolio_cache.refresh()
+        self.price_cache.refresh()
+        current = {**self.portfolio_cache.entries, **self.price_cache.entries}
+        with self.lock:
+            for key in list(self.rendered):
+                portfolio_file, portfolio_version, price_file, price_version, _ = key
+                if (current.get(portfolio_file, (None,))[0] != portfolio_version or
+                    current.get(price_file, (None,))[0] != price_version):
+                    del self.rendered[key]
+
+class ReportHandler(socketserver.StreamRequestHandler):
+    '''
+    Answers report requests, one JSON object per line, until the client disconnects.
+    '''
+    def handle(self) -> None:
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                text = self.server.service.report(request['portfolio'], request.get('prices'), request.get('fmt', 'txt'))
+                response = {'ok': True, 'report': text}
+            except Exception as e:
+                response = {'ok': False, 'error': f'{type(e).__name__}: {e}'}
+            self.wfile.write(json.dumps(response).encode() + b'\n')
+            self.wfile.flush()
+
+class ReportServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, service: ReportService):
+        self.service = service
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        super().__init__(socket_path, ReportHandler)
+
+def watch(service: ReportService, interval: float, stop: threading.Event) -> None:
+    """
+    Poll the cached files for changes until stopped.
+
+    Args:
+        service (ReportService): The service whose files are watched.
+        interval (float): Seconds between polls.
+        stop (threading.Event): Set to end the watcher.
+    """
+    while not stop.wait(interval):
+        service.refresh()
+
+def serve(socket_path: str, service: ReportService, interval: float = 1.0) -> None:
+    """
+    Run the report server until interrupted.
+
+    Args:
+        socket_path (str): The Unix domain socket to listen on.
+        service (ReportService): The service answering the requests.
+        interval (float): Seconds between checks of the cached files for changes.
+    """
+    stop = threading.Event()
+    threading.Thread(target=watch, args=(service, interval, stop), daemon=True).start()
+    with ReportServer(socket_path, service) as server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            stop.set()
+            os.unlink(socket_path)
+
+def parse_portfolios(specs: List[str]) -> Dict[str, Path]:
+    '''
+    Parse "id=path" portfolio registrations.
+    '''
+    portfolios = {}
+    for spec in specs:
+        name, sep, filename = spec.partition('=')
+        if not sep:
+            raise argparse.ArgumentTypeError(f'Expected id=path, got {spec}')
+        portfolios[name] = Path(filename)
+    return portfolios
+
+def main():
+
+    # Declare the argparser
+    parser = argparse.ArgumentParser(description="Serve portfolio reports over a Unix domain socket.")
+    parser.add_argument("--socket",    type=str, default=DEFAULT_SOCKET, help="Path of the Unix domain socket")
+    parser.add_argument("--prices",    type=Path, help="Path to the default prices file")
+    parser.add_argument("--portfolio", type=str, nargs='*', default=[], help="Portfolios to preload, as id=path")
+    parser.add_argument("--interval",  type=float, default=1.0, help="Seconds between checks for changed files")
+    args = parser.parse_args()
+
+    # Preload the data files so the first requests are fast as well
+    service = ReportService(parse_portfolios(args.portfolio), args.prices)
+    for name in service.portfolios:
+        service.portfolio_cache.get(service.resolve(name))
+    if args.prices:
+        service.price_cache.get(args.prices.resolve())
+
+    print(f'Serving reports on {args.socket}', file=sys.stderr)
+    serve(args.socket, service, args.interval)
+
+# If you know you know ;)
+if __name__ == '__main__':
+    main()
@@ -1,19 +1,89 @@
 # stock.py
-# stock.py
-from pydantic import BaseModel, Field
+import weakref
+from typing import Any, Dict, Iterator
+from pydantic import BaseModel, Field, PrivateAttr
+
+class Observers:
+    '''
+    The objects notified when a stock changes.
+
+    Observers are held by weak reference, so a stock does not keep the
+    portfolios built over it alive. They belong to the stock object they were
+    registered on, so copies and pickles of the stock start out with none.
+    An observer registered several times is notified as many times.
+    '''
+    def __init__(self) -> None:
+        self.refs: Dict[int, list] = {}
+
+    def append(self, observer: Any) -> None:
+        entry = self.refs.get(id(observer))
+        if entry is not None and entry[0]() is observer:
+            entry[1] += 1
+        else:
+            self.refs[id(observer)] = [weakref.ref(observer), 1]
+
+    def remove(self, observer: Any) -> None:
+        entry = self.refs.get(id(observer))
+        if entry is None or entry[0]() is not observer:
+            raise ValueError(f'{observer!r} is not an observer')
+        entry[1] -= 1
+        if not entry[1]:
+            del self.refs[id(observer)]
+
+    def __iter__(self) -> Iterator[Any]:
+        observers = []
+        for key, (ref, count) in list(self.refs.items()):
+            observer = ref()
+            if observer is None:
+                del self.refs[key]
+            else:
+                observers.extend([observer] * count)
+        return iter(observers)
+
+    def __bool__(self) -> bool:
+        return bool(self.refs)
+
+    def __reduce__(self):
+        return (Observers, ())
 
 class Stock(BaseModel):
     """
     Represents a stock holding with a name, number of shares, and price per share.
+
+    After every (validated) assignment to a field, each registered observer's
+    stock_changed(stock, field, old_value) method is called.
     """
     name:   str   = Field(description="Stock symbol")
     shares: int   = Field(description="Number of shares")
     price:  float = Field(description="Price per share")
 
+    _observers: Observers = PrivateAttr(default_factory=Observers)
+
     # Enforce that every assignment is valid
     class Config:
         validate_assignment = True
 
+    def __setattr__(self, name: str, value: Any) -> None:
+        if name.startswith('_') or not self._observers:
+            super().__setattr__(name, value)
+            return
+        old = getattr(self, name)
+        super().__setattr__(name, value)
+        for observer in self._observers:
+            observer.stock_changed(self, name, old)
+
+    def __copy__(self) -> "Stock":
+        # pydantic copies the private attributes shallowly, which would share the observers
+        other = super().__copy__()
+        other._observers = Observers()
+        return other
+
+    def __eq__(self, other: Any) -> bool:
+        # Compare the fields only, not the observers
+        if not isinstance(other, Stock):
+            return NotImplemented
+        return (self.name, self.shares, self.price) == (other.name, other.shares, other.price)
+
     @property
     def cost(self) -> float:
         """
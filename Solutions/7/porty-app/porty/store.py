@@ -0,0 +1,221 @@
+# store.py
+
+import argparse
+import sqlite3
+from operator import itemgetter
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Union
+
+import porty.fileparse as fileparse
+import porty.report as report
+import porty.tableformat as tableformat
+from porty.stock import Stock
+
+# The tables of a store. Holdings keep their insertion order through the rowid.
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS holdings (
+    id     INTEGER PRIMARY KEY,
+    name   TEXT NOT NULL,
+    shares INTEGER NOT NULL,
+    price  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS holdings_name ON holdings (name);
+CREATE TABLE IF NOT EXISTS prices (
+    name  TEXT PRIMARY KEY,
+    price REAL NOT NULL
+);
+'''
+
+# The report of make_report, computed by the database. Unknown prices count as 0.0.
+_REPORT = '''
+SELECT h.name, h.shares, COALESCE(p.price, 0.0), COALESCE(p.price, 0.0) - h.price
+FROM holdings AS h LEFT JOIN prices AS p ON p.name = h.name
+'''
+
+class PortfolioStore:
+    """
+    A portfolio and a price table kept in an SQLite database.
+
+    Files are bulk loaded once, in a single transaction each, and reports,
+    totals and lookups are then answered by queries instead of reparsing the
+    CSV files. The database is in WAL mode, so readers in other processes
+    are not blocked while it is being updated.
+    """
+    def __init__(self, path: Union[str, Path]):
+        self.conn = sqlite3.connect(str(path))
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> "PortfolioStore":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def load_portfolio(self, filename: Path, replace: bool = True) -> int:
+        """
+        Bulk load a portfolio CSV file.
+
+        When replacing, the index on name is dropped during the load and built
+        again afterwards, which is faster than updating it row by row.
+
+        Args:
+            filename (Path): Path to the CSV file with portfolio data.
+            replace (bool): Replace the current holdings instead of adding to them.
+
+        Returns:
+            int: The number of holdings loaded.
+        """
+        with open(filename) as lines:
+            rows = fileparse.parse_csv(lines, select=['name', 'shares', 'price'], types=[str, int, float])
+        with self.conn:
+            # sqlite3 only begins a transaction at the first DML statement, so
+            # begin it here to roll the DROP INDEX back with a failed load
+            self.conn.execute('BEGIN')
+            if replace:
+                self.conn.execute('DROP INDEX IF EXISTS holdings_name')
+                self.conn.execute('DELETE FROM holdings')
+            self.conn.executemany('INSERT INTO holdings (name, shares, price) VALUES (?, ?, ?)',
+                                  map(itemgetter('name', 'shares', 'price'), rows))
+            if replace:
+                self.conn.execute('CREATE INDEX holdings_name ON holdings (name)')
+        return len(rows)
+
+    def load_prices(self, filename: Path, replace: bool = False) -> int:
+        """
+        Bulk load a prices CSV file, updating the prices already stored.
+
+        Args:
+            filename (Path): Path to the CSV file with price data.
+            replace (bool): Drop all the stored prices first.
+
+        Returns:
+            int: The number of prices loaded.
+        """
+        with open(filename) as lines:
+            rows = fileparse.parse_csv(lines, types=[str, float], has_headers=False)
+        return self.update_prices(rows, replace)
+
+    def update_prices(self, prices: Union[Dict[str, float], Iterable[tuple]], replace: bool = False) -> int:
+        """
+        Set the current price of stocks.
+
+        Args:
+            prices: A mapping of names to prices, or (name, price) pairs.
+            replace (bool): Drop all the stored prices first.
+
+        Returns:
+            int: The number of prices written.
+        """
+        rows = list(prices.items() if isinstance(prices, dict) else prices)
+        with self.conn:
+            if replace:
+                self.conn.execute('DELETE FROM prices')
+            self.conn.executemany('INSERT OR REPLACE INTO prices (name, price) VALUES (?, ?)', rows)
+        return len(rows)
+
+    def add(self, stocks: Iterable[Stock]) -> None:
+        """
+        Add holdings.
+        """
+        with self.conn:
+            self.conn.executemany('INSERT INTO holdings (name, shares, price) VALUES (?, ?, ?)',
+                                  ((s.name, s.shares, s.price) for s in stocks))
+
+    def sell(self, name: str, shares: int) -> int:
+        """
+        Sell shares of a stock, from its oldest holdings first. Holdings sold out are removed.
+
+        Args:
+            name (str): The stock symbol.
+            shares (int): The number of shares to sell.
+
+        Returns:
+            int: The number of shares actually sold.
+        """
+        sold = 0
+        with self.conn:
+            for rowid, held in self.conn.execute('SELECT id, shares FROM holdings WHERE name = ? ORDER BY id', (name,)).fetchall():
+                if sold == shares:
+                    break
+                n = min(held, shares - sold)
+                if n == held:
+                    self.conn.execute('DELETE FROM holdings WHERE id = ?', (rowid,))
+                else:
+                    self.conn.execute('UPDATE holdings SET shares = shares - ? WHERE id = ?', (n, rowid))
+                sold += n
+        return sold
+
+    def stocks(self, name: str = None) -> Iterator[Stock]:
+        """
+        Iterate over the holdings (of one stock, using the index on name).
+        """
+        query = 'SELECT name, shares, price FROM holdings'
+        rows = self.conn.execute(query + ' WHERE name = ? ORDER BY id', (name,)) if name else self.conn.execute(query + ' ORDER BY id')
+        for name, shares, price in rows:
+            yield Stock(name=name, shares=shares, price=price)
+
+    def shares(self, name: str) -> int:
+        """
+        The number of shares held of a stock.
+        """
+        return self.conn.execute('SELECT COALESCE(SUM(shares), 0) FROM holdings WHERE name = ?', (name,)).fetchone()[0]
+
+    @property
+    def total_cost(self) -> float:
+        """
+        The total cost (shares * purchase price) of the holdings.
+        """
+        return self.conn.execute('SELECT COALESCE(SUM(shares * price), 0.0) FROM holdings').fetchone()[0]
+
+    def report(self, symbols: List[str] = None) -> Iterator[report.TableRow]:
+        """
+        Create the report of make_report with an SQL join against the stored prices.
+
+        Rows are streamed from the database as they are read.
+
+        Args:
+            symbols (List[str], optional): Only report on these stock symbols.
+
+        Returns:
+            Iterator[TableRow]: The report rows, in the order the holdings were added.
+        """
+        if symbols:
+            marks = ','.join('?' * len(symbols))
+            cursor = self.conn.execute(f'{_REPORT} WHERE h.name IN ({marks}) ORDER BY h.id', list(symbols))
+        else:
+            cursor = self.conn.execute(f'{_REPORT} ORDER BY h.id')
+        return map(report.TableRow._make, cursor)
+
+def main():
+
+    # Declare the argparser
+    parser = argparse.ArgumentParser(description="Keep a portfolio and prices in an SQLite database and report on them.")
+    parser.add_argument("database",    type=Path, help="Path to the database file (created if missing)")
+    parser.add_argument("--portfolio", type=Path, help="Load (replace) the holdings from this portfolio file")
+    parser.add_argument("--prices",    type=Path, help="Load (update) the prices from this prices file")
+    parser.add_argument("--symbols",   type=str, help="Comma-separated symbols to report on (default: all)")
+    parser.add_argument("--fmt",       type=str, default='txt', help="The table format")
+    parser.add_argument("--no-report", action='store_true', help="Only load the files")
+    args = parser.parse_args()
+
+    with PortfolioStore(args.database) as store:
+
+        # Load the files given
+        if args.portfolio:
+            store.load_portfolio(args.portfolio)
+        if args.prices:
+            store.load_prices(args.prices)
+
+        # Stream the report out of the database
+        if not args.no_report:
+            symbols = args.symbols.split(',') if args.symbols else None
+            report.print_report(store.report(symbols), tableformat.create_formatter(args.fmt))
+
+# If you know you know ;)
+if __name__ == '__main__':
+    main()
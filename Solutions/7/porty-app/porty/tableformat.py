@@ -1,8 +1,55 @@
 # tableformat.py
 
-from typing import List
+import multiprocessing
+import sys
+from itertools import islice, starmap
+from operator import attrgetter
+from typing import Iterable, Iterator, List, Sequence, TextIO
+
+def field(spec: str, align: str = '') -> str:
+    '''
+    Make a replacement field out of a column format spec.
+
+    A spec may start with a conversion ('!s' or '!r') applied before formatting,
+    and must not give a width since formatters add their own alignment.
+    '''
+    conversion = ''
+    if spec.startswith('!'):
+        conversion, spec = spec[:2], spec[2:]
+    return '{' + conversion + ':' + align + spec + '}'
+
+def _chunks(rows: Iterable[Sequence], size: int) -> Iterator[List[Sequence]]:
+    '''
+    Split rows into lists of at most size rows.
+    '''
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+def _render_chunk(task: tuple) -> str:
+    '''
+    Render a chunk of rows with a row template (in a worker process).
+    '''
+    template, chunk = task
+    return ''.join(starmap(template.format, chunk))
 
 class TableFormatter:
+    # Defaults for subclasses that do not call TableFormatter.__init__
+    out: TextIO = None
+    workers: int = 1
+    chunk_rows: int = 50_000
+
+    def __init__(self, out: TextIO = None, workers: int = 1, chunk_rows: int = 50_000) -> None:
+        '''
+        Args:
+            out (TextIO, optional): The stream to write the table to. Defaults to sys.stdout.
+            workers (int): Number of processes rendering rows. Only formatters with a template() render in parallel.
+            chunk_rows (int): Number of rows rendered per task when rendering in parallel.
+        '''
+        self.out = out
+        self.workers = workers
+        self.chunk_rows = chunk_rows
+
     def headings(self, headers: List[str]) -> None:
         '''
         Emit the table headings.
@@ -21,60 +68,118 @@ class TableFormatter:
         '''
         raise NotImplementedError()
 
+    def template(self, formats: List[str]) -> str:
+        '''
+        Compile the template of a whole row, including its line ending.
+
+        Optional: formatters without a template emit rows one at a time through row().
+
+        Args:
+            formats (List[str]): The format spec of each column (e.g. 's', 'd', '.2f').
+        '''
+        raise NotImplementedError()
+
+    def rows(self, rows: Iterable[Sequence], formats: List[str]) -> None:
+        '''
+        Emit many rows of raw (unformatted) values.
+
+        The row template is compiled once, and each row is then rendered by a
+        single call to its format method. Formatters that do not define a
+        template() get each cell formatted with its spec and passed to row().
+
+        Args:
+            rows (Iterable[Sequence]): The rows of values.
+            formats (List[str]): The format spec of each column (e.g. 's', 'd', '.2f').
+        '''
+        if type(self).template is TableFormatter.template:
+            cells = [field(spec).format for spec in formats]
+            for values in rows:
+                self.row([cell(value) for cell, value in zip(cells, values)])
+            return
+        out = self.out if self.out is not None else sys.stdout
+        template = self.template(formats)
+        if self.workers > 1:
+            self.rows_parallel(out, template, rows)
+        else:
+            out.writelines(starmap(template.format, rows))
+
+    def rows_parallel(self, out: TextIO, template: str, rows: Iterable[Sequence]) -> None:
+        '''
+        Render rows in chunks on a process pool and write the chunks in their original order.
+
+        Args:
+            out (TextIO): The stream to write to.
+            template (str): The compiled row template.
+            rows (Iterable[Sequence]): The rows of values.
+        '''
+        tasks = ((template, chunk) for chunk in _chunks(rows, self.chunk_rows))
+        with multiprocessing.Pool(self.workers) as pool:
+            for text in pool.imap(_render_chunk, tasks):
+                out.write(text)
+
 class TextTableFormatter(TableFormatter):
     '''
     Emit a table in plain-text format
     '''
     def headings(self, headers: List[str]) -> None:
-        print(' '.join([f'{header:>10s}' for header in headers]))
-        print(('-'*10 + ' ')*len(headers))
+        print(' '.join([f'{header:>10s}' for header in headers]), file=self.out)
+        print(('-'*10 + ' ')*len(headers), file=self.out)
 
     def row(self, rowdata: List[str])  -> None:
-        print(' '.join([f'{data:>10s}' for data in rowdata]))
+        print(' '.join([f'{data:>10s}' for data in rowdata]), file=self.out)
+
+    def template(self, formats: List[str]) -> str:
+        return ' '.join(field(spec, '>10') for spec in formats) + '\n'
 
 class CSVTableFormatter(TableFormatter):
     '''
     Output data in CSV format.
     '''
     def headings(self, headers):
-        print(','.join(headers))
+        print(','.join(headers), file=self.out)
 
     def row(self, rowdata):
-        print(','.join(rowdata))
+        print(','.join(rowdata), file=self.out)
+
+    def template(self, formats):
+        return ','.join(field(spec) for spec in formats) + '\n'
 
 class HTMLTableFormatter(TableFormatter):
     '''
     Output data in HTML format.
     '''
     def headings(self, headers):
-        print('<tr>', end='')
+        print('<tr>', end='', file=self.out)
         for h in headers:
-            print(f'<th>{h}</th>', end='')
-        print('</tr>')
+            print(f'<th>{h}</th>', end='', file=self.out)
+        print('</tr>', file=self.out)
 
     def row(self, rowdata):
-        print('<tr>', end='')
+        print('<tr>', end='', file=self.out)
         for d in rowdata:
-            print(f'<td>{d}</td>', end='')
-        print('</tr>')
+            print(f'<td>{d}</td>', end='', file=self.out)
+        print('</tr>', file=self.out)
+
+    def template(self, formats):
+        return '<tr>' + ''.join(f'<td>{field(spec)}</td>' for spec in formats) + '</tr>\n'
 
 class FormatError(Exception):
     pass
 
-def create_formatter(name):
+def create_formatter(name: str, out: TextIO = None, workers: int = 1) -> TableFormatter:
     '''
     Create an appropriate formatter given an output format name
     '''
     if name == 'txt':
-        return TextTableFormatter()
+        return TextTableFormatter(out, workers)
     elif name == 'csv':
-        return CSVTableFormatter()
+        return CSVTableFormatter(out, workers)
     elif name == 'html':
-        return HTMLTableFormatter()
+        return HTMLTableFormatter(out, workers)
     else:
         raise FormatError(f'Unknown table format {name}')
 
-def print_table(objects: List[object], columns: List[str], formatter: TableFormatter) -> None:
+def print_table(objects: List[object], columns: List[str], formatter: TableFormatter, formats: List[str] = None) -> None:
     """
     Print a formatted table from a list of objects using the specified formatter.
 
@@ -82,9 +187,10 @@ def print_table(objects: List[object], columns: List[str], formatter: TableForma
         objects (List[object]): A list of objects to be displayed in the table.
         columns (List[str]): A list of attribute names to extract from each object.
         formatter (TableFormatter): An instance of a TableFormatter subclass to control output format.
+        formats (List[str], optional): The format spec of each column. Defaults to str() of each value.
     """
     formatter.headings(columns)
-    for obj in objects:
-        rowdata = [str(getattr(obj, name)) for name in columns]
-        formatter.row(rowdata)
+    getter = attrgetter(*columns)
+    rows = map(getter, objects) if len(columns) > 1 else ((getter(obj),) for obj in objects)
+    formatter.rows(rows, formats or ['!s'] * len(columns))
 
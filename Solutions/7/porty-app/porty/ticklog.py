@@ -0,0 +1,171 @@
+# ticklog.py
+
+import argparse
+import bz2
+import csv
+import functools
+import gzip
+import heapq
+import io
+import lzma
+import sys
+from operator import itemgetter
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, Optional, TextIO, Tuple
+
+import porty.fileparse as fileparse
+import porty.tableformat as tableformat
+
+# The columns of a tick log (stocksim.py's stocklog.csv, dowstocks.csv, datagen ticks)
+TICK_COLUMNS = ['name', 'price', 'date', 'time', 'change', 'open', 'high', 'low', 'volume']
+
+# Openers of compressed files, by file extension
+OPENERS: Dict[str, Callable] = { '.gz': gzip.open, '.bz2': bz2.open, '.xz': lzma.open }
+
+# The default size of the read and write buffers
+BUFFER_SIZE = 1024 * 1024
+
+def open_log(filename: Path, mode: str = 'r', buffer_size: int = BUFFER_SIZE) -> TextIO:
+    """
+    Open a (possibly compressed) log file as text, with a large buffer.
+
+    Args:
+        filename (Path): The file. Compression is inferred from the extension (.gz, .bz2 or .xz).
+        mode (str): 'r' to read or 'w' to write.
+        buffer_size (int): The size of the buffer.
+
+    Returns:
+        TextIO: The open file.
+    """
+    opener = OPENERS.get(Path(filename).suffix)
+    if opener is None:
+        return open(filename, mode, buffering=buffer_size, newline='')
+    raw = opener(filename, mode + 'b')
+    buffered = io.BufferedReader(raw, buffer_size) if mode == 'r' else io.BufferedWriter(raw, buffer_size)
+    return io.TextIOWrapper(buffered, newline='')
+
+@functools.lru_cache(maxsize=65536)
+def tick_time(date: str, time: str) -> float:
+    '''
+    Convert the (unquoted) date and time of a tick to minutes since 1970-01-01.
+
+    Times are either "9:36am" (dowstocks.csv) or "09:36.30" (stocksim.py logs, with seconds).
+    Raises a ValueError if the date or time is malformed.
+    '''
+    if time and time[-1] in 'mM':
+        minutes = fileparse.parse_time(time)
+    else:
+        hour, rest = time.split(':')
+        minute, _, seconds = rest.partition('.')
+        minutes = int(hour) * 60 + int(minute) + (int(seconds) / 60 if seconds else 0)
+    return fileparse.parse_date(date) * 24 * 60 + minutes
+
+def _is_header(line: str) -> bool:
+    return line.startswith('name,')
+
+def read_log(filename: Path, buffer_size: int = BUFFER_SIZE, errors: Optional[fileparse.ErrorLog] = None) -> Iterator[Tuple[float, str]]:
+    """
+    Lazily read the lines of a tick log, with the time of each tick.
+
+    Only the date and time fields are looked at, so lines pass through
+    unchanged. A header line is skipped, and so is a line without a valid
+    date and time.
+
+    Args:
+        filename (Path): The tick log, possibly compressed.
+        buffer_size (int): The size of the read buffer.
+        errors (ErrorLog, optional): Collect the bad lines here instead of printing them.
+
+    Returns:
+        Iterator[Tuple[float, str]]: (time, line) pairs, in file order.
+    """
+    with open_log(filename, 'r', buffer_size) as f:
+        row_num = 0
+        for line in f:
+            if not line.strip() or _is_header(line):
+                continue
+            row_num += 1
+            try:
+                _, _, date, time = line.split(',', 4)[:4]
+                t = tick_time(date.strip('"'), time.strip('"'))
+            except ValueError as e:
+                fields = line.rstrip('\r\n').split(',')
+                if errors is not None:
+                    errors.add(row_num, fields, 'time', e)
+                else:
+                    print(f"Row {row_num}: Couldn't convert {fields}")
+                    print(f"Row {row_num}: Reason {e}")
+                continue
+            yield t, line
+
+def has_header(filename: Path) -> bool:
+    '''
+    Check whether a tick log starts with a header line.
+    '''
+    with open_log(filename, 'r', 4096) as f:
+        return _is_header(f.readline())
+
+def merge_logs(filenames: Iterable[Path], buffer_size: int = BUFFER_SIZE, errors: Optional[fileparse.ErrorLog] = None) -> Iterator[str]:
+    """
+    Merge tick logs, each in time order, into a single time-ordered stream of lines.
+
+    The logs are read lazily and merged with a heap, so memory use depends
+    on the number of logs, not on their size. Ticks at the same time keep
+    the order of the logs they came from.
+
+    Args:
+        filenames (Iterable[Path]): The tick logs, possibly compressed.
+        buffer_size (int): The size of the read buffer of each log.
+        errors (ErrorLog, optional): Collect the bad lines of every log here instead of printing them.
+
+    Returns:
+        Iterator[str]: The lines of all the logs, in time order.
+    """
+    streams = [read_log(filename, buffer_size, errors) for filename in filenames]
+    return map(itemgetter(1), heapq.merge(*streams, key=itemgetter(0)))
+
+def write_log(lines: Iterable[str], filename: Path, header: bool = False, buffer_size: int = BUFFER_SIZE) -> int:
+    """
+    Write lines to a new (possibly compressed) tick log.
+
+    Returns:
+        int: The number of ticks written.
+    """
+    count = 0
+    with open_log(filename, 'w', buffer_size) as out:
+        if header:
+            out.write(','.join(TICK_COLUMNS) + '\n')
+        for line in lines:
+            out.write(line if line.endswith('\n') else line + '\n')
+            count += 1
+    return count
+
+def print_ticks(lines: Iterable[str], formatter: tableformat.TableFormatter) -> None:
+    """
+    Print tick log lines as a table.
+    """
+    formatter.headings(TICK_COLUMNS)
+    formatter.rows(csv.reader(lines), ['s'] * len(TICK_COLUMNS))
+
+def main():
+
+    # Declare the argparser
+    parser = argparse.ArgumentParser(description="Merge tick logs into one time-ordered stream.")
+    parser.add_argument("logs",     type=Path, nargs='+', help="The tick logs to merge (.gz, .bz2 and .xz are decompressed)")
+    parser.add_argument("--output", type=Path, help="Write the merged ticks to this log (compressed by extension)")
+    parser.add_argument("--fmt",    type=str, default='txt', help="The table format, when printing the ticks")
+    args = parser.parse_args()
+
+    errors = fileparse.ErrorLog()
+    merged = merge_logs(args.logs, errors=errors)
+    if args.output:
+        count = write_log(merged, args.output, header=any(has_header(log) for log in args.logs))
+        print(f'{count} ticks from {len(args.logs)} logs written to {args.output}', file=sys.stderr)
+    else:
+        print_ticks(merged, tableformat.create_formatter(args.fmt))
+    for line in errors.summary():
+        print(line, file=sys.stderr)
+
+# If you know you know ;)
+if __name__ == '__main__':
+    main()
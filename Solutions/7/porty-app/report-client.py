@@ -0,0 +1,5 @@
+#!/usr/bin/env python3
+# report-client.py
+
+from porty.client import main
+main()
@@ -9,5 +9,5 @@ setuptools.setup(
     author_email="you@example.com",
     description="Practical Python Code",
     packages=setuptools.find_packages(),
-    scripts=['print-report.py'],
+    scripts=['print-report.py', 'report-client.py'],
 )
@@ -0,0 +1,72 @@
+# test_mortgage.py
+
+import random
+
+import numpy as np
+import pytest
+
+from porty.mortgage import Amortization, Window, simulate, simulate_loan, solve_payment
+
+def _annuity(principal: float, rate: float, months: int) -> float:
+    r = rate / 12
+    return principal / months if r == 0 else principal * r / (1 - (1 + r) ** -months)
+
+def random_loans(n: int, seed: int = 0, nwindows: int = 3) -> list:
+    '''
+    Random loans as (principal, rate, payment, windows), with zero rates, loans
+    that are never paid off and windows starting and ending mid-term.
+    '''
+    rng = random.Random(seed)
+    loans = []
+    for _ in range(n):
+        principal = rng.uniform(10_000, 500_000)
+        rate = 0.0 if rng.random() < 0.2 else rng.uniform(0.01, 0.1)
+        payment = _annuity(principal, rate, rng.randint(60, 480)) * rng.uniform(1.0, 1.5)
+        if rng.random() < 0.1:
+            payment = principal * rate / 12 * rng.uniform(0.5, 1.0) or 1.0
+        windows = []
+        for _ in range(nwindows):
+            start = rng.randint(1, 400)
+            end = start + rng.randint(0, 200)
+            windows.append(Window(rng.choice([0.0, rng.uniform(100, 5000)]), start, end))
+        loans.append((principal, rate, payment, windows))
+    return loans
+
+LOANS = random_loans(300)
+
+@pytest.mark.parametrize('principal, rate, payment, windows', LOANS[:100])
+def test_payoff_matches_simulate_loan(principal, rate, payment, windows):
+    expected_paid, expected_months = simulate_loan(principal, rate, payment, windows)
+    total_paid, months = Amortization(principal, rate, payment, windows).payoff()
+    assert months == expected_months
+    assert total_paid == pytest.approx(expected_paid, rel=1e-9)
+
+def test_simulate_matches_simulate_loan():
+    principal, rate, payment = (np.array(column) for column in zip(*[loan[:3] for loan in LOANS]))
+    windows = [Window(*(np.array(field) for field in zip(*[loan[3][i] for loan in LOANS]))) for i in range(3)]
+    result = simulate(principal, rate, payment, windows)
+    for i, loan in enumerate(LOANS):
+        expected_paid, expected_months = simulate_loan(*loan)
+        assert result.months[i] == expected_months
+        assert result.total_paid[i] == pytest.approx(expected_paid, rel=1e-12)
+
+def test_never_paid_off():
+    total_paid, months = Amortization(100_000, 0.06, 400, [Window(1000, 13, 24)]).payoff(max_months=360)
+    assert (total_paid, months) == pytest.approx(simulate_loan(100_000, 0.06, 400, [Window(1000, 13, 24)], 360))
+    assert months == -1
+
+@pytest.mark.parametrize('principal, rate, payment, windows', LOANS[:20])
+def test_balance_at_matches_iteration(principal, rate, payment, windows):
+    amortization = Amortization(principal, rate, payment, windows)
+    balance = principal
+    for month in range(1, 241):
+        balance = balance * (1 + rate / 12) - payment - sum(w.extra for w in windows if w.start <= month <= w.end)
+        assert amortization.balance_at(month) == pytest.approx(balance, rel=1e-9, abs=1e-6)
+
+@pytest.mark.parametrize('principal, rate, payment, windows', LOANS[:50])
+def test_solve_payment_pays_off_on_time(principal, rate, payment, windows):
+    months = 360
+    solved = solve_payment(principal, rate, months, windows)
+    assert simulate_loan(principal, rate, solved, windows)[1] <= months
+    if solved > 0:
+        assert simulate_loan(principal, rate, solved * (1 - 1e-6), windows, max_months=months)[1] in (months, -1)
@@ -0,0 +1,101 @@
+# test_portfolio.py
+
+import copy
+import random
+import weakref
+
+import pytest
+
+from porty.portfolio import Portfolio
+from porty.stock import Stock
+
+def make_portfolio() -> Portfolio:
+    return Portfolio(stocks=[Stock(name='A', shares=10, price=1.0), Stock(name='B', shares=2, price=1.5)])
+
+def check_indexes(p: Portfolio) -> None:
+    '''
+    Check the indexes and totals of a portfolio against its holdings.
+    '''
+    assert p.total_cost == pytest.approx(sum(s.cost for s in p.stocks))
+    for name in {s.name for s in p.stocks}:
+        assert p.shares(name) == sum(s.shares for s in p.stocks if s.name == name)
+        assert sorted(map(id, p[name])) == sorted(id(s) for s in p.stocks if s.name == name)
+    assert sorted(p._by_symbol) == sorted({s.name for s in p.stocks})
+    for low, high in ((0, 100), (1.0, 1.2), (1.5, 1.5)):
+        expected = sorted(id(s) for s in p.stocks if low <= s.price <= high)
+        assert sorted(map(id, p.where(price_between=(low, high)))) == expected
+        expected = sorted(id(s) for s in p.stocks if low <= s.cost <= high)
+        assert sorted(map(id, p.where(cost_between=(low, high)))) == expected
+
+def test_copies_of_a_held_stock_are_not_observed():
+    p = make_portfolio()
+    for c in (p.stocks[0].model_copy(), copy.copy(p.stocks[0]), copy.deepcopy(p.stocks[0])):
+        c.shares = 1000
+        c.name = 'Z'
+        check_indexes(p)
+        assert p.total_cost == 13.0 and p.shares('A') == 10 and 'Z' not in p
+
+def test_list_changes_keep_the_indexes_up_to_date():
+    p = make_portfolio()
+    c, d = Stock(name='C', shares=3, price=1.0), Stock(name='D', shares=4, price=4.0)
+    p.stocks[0:1] = [c, d]
+    check_indexes(p)
+    assert p.total_cost == 22.0 and 'D' in p and 'A' not in p
+    p.stocks[1:] = iter([Stock(name='A', shares=1, price=1.2)])
+    check_indexes(p)
+    p.stocks[0] = d
+    p.stocks.insert(0, Stock(name='E', shares=5, price=1.0))
+    p.stocks.extend([Stock(name='A', shares=7, price=1.1)])
+    p.stocks += [Stock(name='B', shares=1, price=1.0)]
+    check_indexes(p)
+    del p.stocks[::2]
+    p.stocks.pop()
+    check_indexes(p)
+    p.stocks *= 2
+    check_indexes(p)
+    p.stocks[0].shares = 2
+    check_indexes(p)
+    p.stocks.clear()
+    check_indexes(p)
+    assert p.total_cost == 0.0
+
+def test_stocks_do_not_keep_portfolios_alive():
+    p = make_portfolio()
+    stocks = p.stocks[:]
+    q = Portfolio(stocks=stocks)
+    ref = weakref.ref(q)
+    del q
+    assert ref() is None
+    stocks[0].shares = 20
+    stocks[1].name = 'C'
+    check_indexes(p)
+    assert not list(Portfolio(stocks=[]).stocks)
+
+def test_a_stock_held_twice_is_counted_twice():
+    s = Stock(name='A', shares=10, price=1.0)
+    p = Portfolio(stocks=[s, s])
+    s.shares = 5
+    check_indexes(p)
+    p.stocks.pop()
+    s.price = 2.0
+    check_indexes(p)
+    assert p.total_cost == 10.0
+
+def test_range_indexes_follow_random_changes():
+    rng = random.Random(1)
+    p = Portfolio(stocks=[Stock(name=rng.choice('ABC'), shares=rng.randint(1, 5), price=rng.choice([1.0, 1.1, 1.5]))
+                          for _ in range(20)])
+    for _ in range(300):
+        check_indexes(p)
+        stock = rng.choice(p.stocks)
+        change = rng.randrange(5)
+        if change == 0:
+            stock.shares = rng.randint(0, 5)
+        elif change == 1:
+            stock.price = rng.choice([1.0, 1.1, 1.2, 1.5])
+        elif change == 2:
+            stock.name = rng.choice('ABCD')
+        elif change == 3 and len(p.stocks) > 5:
+            p.stocks.remove(stock)
+        else:
+            p.stocks.append(Stock(name=rng.choice('ABC'), shares=rng.randint(1, 5), price=rng.choice([1.0, 1.2])))
@@ -0,0 +1,23 @@
+# test_ticklog.py
+
+import pytest
+
+import porty.fileparse as fileparse
+from porty.ticklog import read_log, tick_time
+
+def test_tick_time_rejects_an_empty_time():
+    with pytest.raises(ValueError):
+        tick_time('6/11/2007', '')
+
+def test_bad_lines_are_skipped_and_logged(tmp_path):
+    log = tmp_path / 'ticks.csv'
+    log.write_text('name,price,date,time,change\n'
+                   'IBM,102.0,6/11/2007,9:30am,0.1\n'
+                   'IBM,102.0\n'
+                   'IBM,102.0,6/11/2007,,0.1\n'
+                   'IBM,102.5,6/11/2007,9:31am,0.6\n')
+    errors = fileparse.ErrorLog()
+    ticks = list(read_log(log, errors=errors))
+    assert [line.split(',')[1] for _, line in ticks] == ['102.0', '102.5']
+    assert errors.total == 2
+    assert [bad.row_num for bad in errors.samples[('time', 'ValueError')]] == [2, 3]
@@ -10,8 +10,12 @@
 # The purpose of this module is to provide data to the user
 # in different ways in order to write interesting Python examples
 
+import heapq
 import math
+import multiprocessing
+import sys
 import time
+from queue import Empty
 
 history_file = "dowstocks.csv"
 
@@ -53,6 +57,10 @@ def csv_record(fields):
     return s
 
 class StockTrack(object):
+    __slots__ = ('name', 'history', 'price', 'time', 'index', 'open', 'low', 'high',
+                 'volume', 'initial', 'change', 'date', 'segments', 'next_t',
+                 'first_t', 'price0', 'price_slope', 'volume0', 'volume_slope')
+
     def __init__(self,name):
         self.name    = name
         self.history = []
@@ -66,18 +74,38 @@ class StockTrack(object):
         self.initial = 0
         self.change  = 0
         self.date    = ""
+        self.segments = []
     def add_data(self,record):
         self.history.append(record)
+
+    # Precompute the interpolation segment between each pair of history
+    # records: (start time, end time, price, price slope, volume, volume slope)
+    def make_segments(self):
+        self.segments = []
+        for first, next in zip(self.history, self.history[1:] or self.history):
+            dt = next[3] - first[3]
+            self.segments.append((first[3], next[3],
+                                  first[1], (next[1] - first[1])/dt if dt else 0.0,
+                                  first[-1], (next[-1] - first[-1])/dt if dt else 0.0))
+
+    # Make the segment at the current index the one being interpolated
+    def load_segment(self):
+        (self.first_t, self.next_t, self.price0, self.price_slope,
+         self.volume0, self.volume_slope) = self.segments[self.index]
+
     def reset(self,time):
         self.time = time
         # Sort the history by time
         self.history.sort(key=lambda t:t[3])
+        self.make_segments()
         # Find the first entry who's time is behind the given time
         self.index = 0
         while self.index < len(self.history):
             if self.history[self.index][3] > time:
                 break
             self.index += 1
+        self.index = min(self.index, len(self.segments) - 1)
+        self.load_segment()
         self.open = self.history[0][5]
         self.initial = self.history[0][1] - self.history[0][4]
         self.date = self.history[0][2]
@@ -86,34 +114,31 @@ class StockTrack(object):
         self.high = self.price
 
     # Calculate interpolated value of a given field based on
-    # current time
+    # current time (only the price, 1, and volume, -1, are interpolated)
     def interpolate(self,field):
-        first = self.history[self.index][field]
-        next  = self.history[self.index+1][field]
-        first_t = self.history[self.index][3]
-        next_t = self.history[self.index+1][3]
-        try:
-            slope = (next - first)/(next_t-first_t)
-            return first + slope*(self.time - first_t)
-        except ZeroDivisionError:
-            return first
+        first_t, next_t, price, price_slope, volume, volume_slope = self.segments[self.index]
+        if field == 1:
+            return price + price_slope*(self.time - first_t)
+        return volume + volume_slope*(self.time - first_t)
 
     # Update all computed values
     def update(self):
-        self.price = round(self.interpolate(1),2)
-        self.volume = int(self.interpolate(-1))
+        elapsed = self.time - self.first_t
+        self.price = round(self.price0 + self.price_slope*elapsed,2)
+        self.volume = int(self.volume0 + self.volume_slope*elapsed)
         if self.price < self.low:
             self.low = self.price
         if self.price >= self.high:
             self.high = self.price
         self.change = self.price - self.initial
-        
+
     # Increment the time by a delta
     def incr(self,dt):
         self.time += dt
-        if self.index < (len(self.history) - 2):
-            while self.index < (len(self.history) - 2) and self.time >= self.history[self.index+1][3]:
+        if self.time >= self.next_t and self.index < len(self.segments) - 1:
+            while self.index < len(self.segments) - 1 and self.time >= self.segments[self.index][1]:
                 self.index += 1
+            self.load_segment()
         self.update()
 
     def make_record(self):
@@ -158,6 +183,83 @@ class MarketSimulator(object):
             time.sleep(dt)
             self.time += (dt/60.0)
 
+    # Run with the stocks split across several worker processes.  Each
+    # worker advances its own tracks and streams back (step, rank, record)
+    # tuples, rank being the position of the stock in self.stocks.  The
+    # streams are merged on virtual time, so the observers see the records
+    # in the same order as with run().  With realtime, each step is
+    # published dt seconds after the previous one; otherwise as fast as
+    # the workers go.  The workers advance copies of the tracks, so only
+    # self.prices is brought up to date here.
+    def run_sharded(self,dt,shards,realtime=True,end=1000):
+        names = list(self.stocks)
+        queues = []
+        workers = []
+        for n in range(shards):
+            ranks = list(range(n, len(names), shards))
+            tracks = [self.stocks[names[r]] for r in ranks]
+            q = multiprocessing.Queue(maxsize=64)
+            w = multiprocessing.Process(target=run_shard, args=(tracks,ranks,self.time,dt,end,q), daemon=True)
+            w.start()
+            queues.append(q)
+            workers.append(w)
+
+        start = time.perf_counter()
+        try:
+            for step, rank, record in heapq.merge(*[shard_records(q,w) for q,w in zip(queues,workers)]):
+                if realtime and step > 1:
+                    delay = start + (step-1)*dt - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                self.prices[record[0]] = record[1]
+                self.publish(record)
+        finally:
+            for w in workers:
+                w.terminate()
+                w.join()
+        self.time = end
+
+# Advance a shard of tracks in a worker process, sending batches of
+# (step, rank, record) tuples to a queue.  None marks the end.
+def run_shard(tracks,ranks,now,dt,end,queue,batch_size=1000):
+    prices = { }
+    batch = []
+    for rank, s in zip(ranks,tracks):
+        prices[s.name] = s.price
+        batch.append((0,rank,s.make_record()))
+    step = 0
+    while now < end:
+        step += 1
+        for rank, s in zip(ranks,tracks):
+            s.incr(dt/60.0)
+            if s.price != prices[s.name]:
+                prices[s.name] = s.price
+                batch.append((step,rank,s.make_record()))
+        if len(batch) >= batch_size:
+            queue.put(batch)
+            batch = []
+        now += (dt/60.0)
+    queue.put(batch)
+    queue.put(None)
+
+# Iterate over the records sent by run_shard.  Raises RuntimeError if the
+# worker dies before sending them all, instead of waiting forever.  A worker
+# that exited cleanly may still have its last batches in the pipe, so they
+# are drained before deciding it failed.
+def shard_records(queue,worker,timeout=1.0):
+    while True:
+        if worker.exitcode:
+            raise RuntimeError(f'{worker.name} failed with exit code {worker.exitcode}')
+        try:
+            batch = queue.get(timeout=timeout) if worker.exitcode is None else queue.get_nowait()
+        except Empty:
+            if worker.exitcode is not None:
+                raise RuntimeError(f'{worker.name} exited with code {worker.exitcode} before finishing its shard')
+            continue
+        if batch is None:
+            return
+        yield from batch
+
 
 class BasicPrinter(object):
     def update(self,record):
@@ -170,14 +272,20 @@ class LogPrinter(object):
         self.f.write(csv_record(record)+"\n")
         self.f.flush()
 
-m = MarketSimulator()
-m.add_history(history_file)
-m.reset(minutes("9:30am"))
+if __name__ == '__main__':
+    m = MarketSimulator()
+    m.add_history(history_file)
+    m.reset(minutes("9:30am"))
 
-m.register(BasicPrinter())
-m.register(LogPrinter("stocklog.csv"))
+    m.register(BasicPrinter())
+    m.register(LogPrinter("stocklog.csv"))
 
-m.run(1)
+    # python stocksim.py [shards]
+    shards = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    if shards > 1:
+        m.run_sharded(1,shards)
+    else:
+        m.run(1)
 
 
    